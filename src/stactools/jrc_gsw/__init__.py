@@ -1,8 +1,4 @@
-import stactools.core
-
-from stactools.jrc_gsw import constants, stac
-
-stactools.core.use_fsspec()
+import importlib
 
 
 def register_plugin(registry):
@@ -11,6 +7,14 @@ def register_plugin(registry):
     registry.register_subcommand(commands.create_jrc_gsw_command)
 
 
-__all__ = [constants, stac]
+def __getattr__(name):
+    # The submodules import rasterio, shapely and fsspec, so they are only
+    # loaded on first access to keep plugin registration fast.
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["constants", "stac"]
 __version__ = "0.1.0"
 """Library version"""
@@ -19,6 +19,10 @@ MONTHLY_HISTORY_KEY = "monthly-history"
 MONTHLY_RECURRENCE_KEY = "monthly-recurrence"
 MONTHLY_RECURRENCE_OBSERVATIONS_KEY = "monthly-recurrence-observations"
 YEARLY_CLASSIFICATION_KEY = "yearly-classification"
+CLASS_AREAS_KEY = "class-areas"
+EXTENT_VECTOR_KEY = "extent-vector"
+YEARLY_PERMANENT_WATER_VECTOR_KEY = "yearly-permanent-water-vector"
+MONTHLY_HISTORY_DATACUBE_KEY = "monthly-history-datacube"
 
 SEASONALITY_START_TIME = "2020-01-01T00:00:00Z"
 SEASONALITY_END_TIME = "2020-12-31T11:59:59Z"
@@ -135,3 +139,54 @@ ITEM_ASSETS: Dict[str, AssetDefinition] = {
         ),
     },
 }
+
+# Vector assets polygonized from the water masks. Their media type depends on
+# the output format and is set when they are created.
+VECTOR_ASSETS: Dict[str, Dict[str, AssetDefinition]] = {
+    AGGREGATED["ID"]: {
+        EXTENT_VECTOR_KEY: AssetDefinition(
+            {
+                "title": "Maximum Water Extent Polygons",
+                "description": (
+                    "Polygons of the area where water was ever present (from 1984-2020)"  # noqa
+                ),
+                "roles": ["data"],
+            }
+        ),
+    },
+    YEARLY_CLASSIFICATION["ID"]: {
+        YEARLY_PERMANENT_WATER_VECTOR_KEY: AssetDefinition(
+            {
+                "title": "Yearly Permanent Water Polygons",
+                "description": (
+                    "Polygons of the area classified as permanent water in the year"
+                ),
+                "roles": ["data"],
+            }
+        ),
+    },
+}
+
+DATACUBE_ASSETS: Dict[str, Dict[str, AssetDefinition]] = {
+    MONTHLY_HISTORY["ID"]: {
+        MONTHLY_HISTORY_DATACUBE_KEY: AssetDefinition(
+            {
+                "title": "Monthly History Datacube",
+                "description": (
+                    "Historical water detection on a month-by-month basis, as a (time, y, x) Zarr array"  # noqa
+                ),
+                "type": "application/vnd+zarr",
+                "roles": ["data"],
+            }
+        ),
+    },
+}
+
+# Categorical assets whose class areas are summarized, per collection.
+SUMMARY_ASSETS = {
+    AGGREGATED["ID"]: [EXTENT_KEY, TRANSITIONS_KEY],
+    MONTHLY_HISTORY["ID"]: [MONTHLY_HISTORY_KEY],
+    YEARLY_CLASSIFICATION["ID"]: [YEARLY_CLASSIFICATION_KEY],
+}
+
+CLASS_AREAS_FILENAME = "class-areas.parquet"
@@ -0,0 +1,393 @@
+import logging
+import os.path
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import fsspec
+import pystac
+
+from stactools.jrc_gsw import dedup, scheduler, stac, summaries, templates, vectors
+from stactools.jrc_gsw.collections import (
+    AGGREGATED,
+    MONTHLY_HISTORY,
+    MONTHLY_RECURRENCE,
+    ROOT,
+    YEARLY_CLASSIFICATION,
+)
+from stactools.jrc_gsw.executors import Executor, SerialExecutor
+from stactools.jrc_gsw.finalize import CollectionFinalizer
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = {
+    "Aggregated": AGGREGATED,
+    "MonthlyHistory": MONTHLY_HISTORY,
+    "MonthlyRecurrence": MONTHLY_RECURRENCE,
+    "YearlyClassification": YEARLY_CLASSIFICATION,
+}
+
+
+@dataclass
+class Partition:
+    """A group of COGs that all belong to the same collection and tile."""
+
+    collection_id: str
+    tile_id: str
+    sources: List[str] = field(default_factory=list)
+
+
+@dataclass
+class ItemBatch:
+    """The items created from a single partition, and their class area
+    summary rows if requested."""
+
+    collection_id: str
+    tile_id: str
+    items: List[dict] = field(default_factory=list)
+    summaries: List[dict] = field(default_factory=list)
+
+
+def tile_id_from_source(source: str) -> str:
+    return os.path.splitext("-".join(os.path.basename(source).split("-")[-2:]))[0]
+
+
+def collection_name_from_source(source: str, downloaded_version: str) -> str:
+    return os.path.basename(os.path.dirname(source.split(downloaded_version)[0]))
+
+
+def find_sources(root: str, downloaded_version: str = "LATEST") -> List[str]:
+    """Finds one COG per item under a JRC-GSW data directory.
+
+    Aggregated items are built from six COGs and MonthlyRecurrence items from
+    two, so only a single COG is returned for each of those items.
+
+    Args:
+        root (str): The root data directory, following the structure found in
+            http://jeodpp.jrc.ec.europa.eu/ftp/jrc-opendata/GSWE/
+        downloaded_version (str, optional): The version directory to catalog.
+            Default: "LATEST".
+
+    Returns:
+        List[str]: Sorted COG hrefs.
+    """
+    fs, root_path = fsspec.core.url_to_fs(root)
+    protocol = fs.protocol if isinstance(fs.protocol, str) else fs.protocol[0]
+
+    sources = []
+    seen = set()
+    for path in sorted(fs.find(root_path)):
+        if not path.endswith(".tif"):
+            continue
+        if protocol not in ("file", "local"):
+            path = f"{protocol}://{path}"
+
+        collection_name = collection_name_from_source(path, downloaded_version)
+        if collection_name not in COLLECTIONS:
+            continue
+
+        if collection_name == "Aggregated":
+            key = (collection_name, tile_id_from_source(path))
+            if key in seen:
+                continue
+            seen.add(key)
+        elif collection_name == "MonthlyRecurrence" and "has_observations" in path:
+            continue
+
+        sources.append(path)
+
+    return sources
+
+
+def partition_sources(
+    sources: Iterable[str],
+    downloaded_version: str = "LATEST",
+    max_partition_size: Optional[int] = None,
+) -> List[Partition]:
+    """Groups COG hrefs by collection and tile.
+
+    Keeping a tile's COGs in one partition lets a worker reuse the tile's
+    cached metadata for every item it builds.
+
+    Args:
+        sources (Iterable[str]): COG hrefs, e.g. from :func:`find_sources`.
+        downloaded_version (str, optional): Default: "LATEST".
+        max_partition_size (int, optional): Split partitions larger than this,
+            so that results stream back in smaller batches.
+
+    Returns:
+        List[Partition]: The partitions.
+    """
+    groups: Dict[Tuple[str, str], List[str]] = {}
+    for source in sources:
+        collection_name = collection_name_from_source(source, downloaded_version)
+        collection_id = COLLECTIONS[collection_name]["ID"]
+        key = (collection_id, tile_id_from_source(source))
+        groups.setdefault(key, []).append(source)
+
+    partitions = []
+    for (collection_id, tile_id), group in groups.items():
+        size = max_partition_size or len(group)
+        for i in range(0, len(group), size):
+            partitions.append(Partition(collection_id, tile_id, group[i : i + size]))
+
+    return partitions
+
+
+def create_item_batch(
+    partition: Partition,
+    destination: str,
+    downloaded_version: str = "LATEST",
+    data_version: str = "VER4-0",
+    summarize: bool = False,
+    vector_format: Optional[str] = None,
+    simplify_tolerance: Optional[float] = None,
+    io_options: Optional[Dict[str, Any]] = None,
+    deduplicate: bool = False,
+    skip_empty: bool = False,
+) -> ItemBatch:
+    """Creates the items of a single partition.
+
+    Args:
+        partition (Partition): The partition to process.
+        destination (str): The root output directory. Items are written to
+            ``<destination>/<collection id>/<item id>.json``.
+        downloaded_version (str, optional): Default: "LATEST".
+        data_version (str, optional): Default: "VER4-0".
+        summarize (bool, optional): Also compute class area summaries.
+        vector_format (str, optional): If given, also polygonize the water
+            masks to ``flatgeobuf`` or ``geoparquet`` vector assets.
+        simplify_tolerance (float, optional): Tolerance, in degrees, with
+            which polygons are simplified.
+        io_options (dict, optional): Options of the worker's
+            :class:`~stactools.jrc_gsw.scheduler.IOScheduler`. Remote COGs
+            are read from up to ``max_concurrency`` threads.
+        deduplicate (bool, optional): Also hash each COG's pixels and flag
+            constant and empty items, see
+            :func:`stactools.jrc_gsw.dedup.flag_item`.
+        skip_empty (bool, optional): With ``deduplicate``, leave out items
+            flagged as entirely no data, without writing their vector assets
+            or summarizing them.
+
+    Returns:
+        ItemBatch: The item dictionaries, without self links.
+    """
+    item_dir = os.path.join(destination, partition.collection_id)
+    io_scheduler = scheduler.configure(**(io_options or {}))
+
+    def build(source: str) -> Tuple[Optional[dict], List[dict]]:
+        item_dict = templates.create_item_dict(
+            source, item_dir, downloaded_version, data_version
+        )
+        if not (vector_format or deduplicate or summarize):
+            return item_dict, []
+
+        item = pystac.Item.from_dict(item_dict, preserve_dict=False)
+        item.set_self_href(os.path.join(item_dir, f"{item.id}.json"))
+        if deduplicate:
+            dedup.flag_item(item)
+            if skip_empty and item.properties.get(dedup.ALL_NODATA):
+                return None, []
+        if vector_format:
+            vectors.create_vector_assets(
+                item, partition.collection_id, vector_format, simplify_tolerance
+            )
+        rows = []
+        if summarize:
+            rows = summaries.summarize_item(item, partition.collection_id)
+            for row in rows:
+                row["tile_id"] = partition.tile_id
+        return item.to_dict(include_self_link=False), rows
+
+    threads = 1
+    if partition.sources and stac.uri_validator(partition.sources[0]):
+        threads = min(io_scheduler.max_concurrency, len(partition.sources))
+
+    batch = ItemBatch(partition.collection_id, partition.tile_id)
+    with ThreadPoolExecutor(threads) as pool:
+        for item, rows in pool.map(build, partition.sources):
+            if item is not None:
+                batch.items.append(item)
+                batch.summaries.extend(rows)
+
+    return batch
+
+
+def create_items(
+    sources: Iterable[str],
+    destination: str,
+    executor: Optional[Executor] = None,
+    downloaded_version: str = "LATEST",
+    data_version: str = "VER4-0",
+    max_partition_size: Optional[int] = None,
+    summarize: bool = False,
+    vector_format: Optional[str] = None,
+    simplify_tolerance: Optional[float] = None,
+    io_options: Optional[Dict[str, Any]] = None,
+    deduplicate: bool = False,
+    skip_empty: bool = False,
+) -> Iterator[ItemBatch]:
+    """Creates STAC items for many COGs, yielding batches as they complete.
+
+    Args:
+        sources (Iterable[str]): COG hrefs, e.g. from :func:`find_sources`.
+        destination (str): The root output directory.
+        executor (Executor, optional): Where to run the work. Defaults to the
+            calling process.
+        downloaded_version (str, optional): Default: "LATEST".
+        data_version (str, optional): Default: "VER4-0".
+        max_partition_size (int, optional): Maximum number of COGs per batch.
+        summarize (bool, optional): Also compute class area summaries.
+        vector_format (str, optional): Also write vector assets in this format.
+        simplify_tolerance (float, optional): Polygon simplification
+            tolerance, in degrees.
+        io_options (dict, optional): Options of each worker's
+            :class:`~stactools.jrc_gsw.scheduler.IOScheduler`, e.g.
+            ``max_concurrency``, ``rate_limit`` and ``max_retries``.
+        deduplicate (bool, optional): Also hash pixels and flag constant and
+            empty items.
+        skip_empty (bool, optional): With ``deduplicate``, leave out empty
+            items, with their vector assets and summary rows.
+
+    Returns:
+        Iterator[ItemBatch]: Item batches, in completion order.
+    """
+    executor = executor or SerialExecutor()
+    partitions = partition_sources(sources, downloaded_version, max_partition_size)
+    logger.info(f"Creating items for {len(partitions)} partitions")
+
+    yield from executor.map_unordered(
+        create_item_batch,
+        partitions,
+        destination=destination,
+        downloaded_version=downloaded_version,
+        data_version=data_version,
+        summarize=summarize,
+        vector_format=vector_format,
+        simplify_tolerance=simplify_tolerance,
+        io_options=io_options,
+        deduplicate=deduplicate,
+        skip_empty=skip_empty,
+    )
+
+
+def item_href(destination: str, collection_id: str, item_id: str) -> str:
+    return os.path.join(destination, collection_id, f"{item_id}.json")
+
+
+def collection_href(destination: str, collection_id: Optional[str] = None) -> str:
+    if collection_id is None:
+        return os.path.join(destination, "collection.json")
+    return os.path.join(destination, collection_id, "collection.json")
+
+
+def write_item_batch(
+    batch: ItemBatch,
+    destination: str,
+    finalizer: Optional[CollectionFinalizer] = None,
+    dedup_index: Optional[dedup.DedupIndex] = None,
+    skip_empty: bool = False,
+) -> List[str]:
+    """Writes the items of a batch to ``<destination>/<collection id>/``.
+
+    Args:
+        batch (ItemBatch): The batch to write.
+        destination (str): The root output directory.
+        finalizer (CollectionFinalizer, optional): If given, each item is
+            added to the finalizer's collection before it is written.
+        dedup_index (DedupIndex, optional): If given, assets whose pixels
+            were already written are pointed at the first copy.
+        skip_empty (bool, optional): Do not write items flagged as entirely
+            no data.
+
+    Returns:
+        List[str]: The hrefs of the written items.
+    """
+    stac_io = pystac.StacIO.default()
+
+    hrefs = []
+    for item in batch.items:
+        if skip_empty and dedup.is_empty(item):
+            continue
+        href = item_href(destination, batch.collection_id, item["id"])
+        if dedup_index is not None:
+            dedup_index.apply(item, href)
+        if finalizer is not None:
+            finalizer.add(item, href)
+        stac_io.save_json(href, item)
+        hrefs.append(href)
+
+    return hrefs
+
+
+def create_finalizer(
+    collection_id: str, destination: str, class_areas_href: Optional[str] = None
+) -> CollectionFinalizer:
+    """Creates a finalizer for one of the collections written by
+    :func:`write_item_batch`.
+
+    Args:
+        collection_id (str): The collection ID.
+        destination (str): The root output directory.
+        class_areas_href (str, optional): href of the class area sidecar.
+
+    Returns:
+        CollectionFinalizer: The finalizer.
+    """
+    collection_defn = next(
+        defn for defn in COLLECTIONS.values() if defn["ID"] == collection_id
+    )
+    return CollectionFinalizer(
+        stac.create_collection(collection_defn, class_areas_href),
+        collection_href(destination, collection_id),
+        collection_href(destination),
+    )
+
+
+def save_collections(
+    finalizers: Iterable[CollectionFinalizer], destination: str
+) -> pystac.Collection:
+    """Finalizes collections and saves them under a root collection.
+
+    Only the collections are written; their items are linked by href and are
+    not read back.
+
+    Args:
+        finalizers (Iterable[CollectionFinalizer]): The finalizers that items
+            were added to.
+        destination (str): The root output directory.
+
+    Returns:
+        pystac.Collection: The root collection.
+    """
+    root = stac.create_collection(ROOT)
+    root.set_self_href(collection_href(destination))
+
+    collections = [finalizer.finalize() for finalizer in finalizers]
+    for collection in collections:
+        root.add_child(collection)
+
+    if collections:
+        bboxes = [c.extent.spatial.bboxes[0] for c in collections]
+        intervals = [c.extent.temporal.intervals[0] for c in collections]
+        root.extent = pystac.Extent(
+            pystac.SpatialExtent(
+                [
+                    [
+                        min(b[0] for b in bboxes),
+                        min(b[1] for b in bboxes),
+                        max(b[2] for b in bboxes),
+                        max(b[3] for b in bboxes),
+                    ]
+                ]
+            ),
+            pystac.TemporalExtent(
+                [[min(i[0] for i in intervals), max(i[1] for i in intervals)]]
+            ),
+        )
+
+    for collection in collections:
+        collection.save_object(include_self_link=False)
+    root.save_object(include_self_link=False)
+
+    return root
@@ -2,14 +2,10 @@ import os
 import click
 import logging
 
-from stactools.jrc_gsw import stac
-from stactools.jrc_gsw.collections import (
-    AGGREGATED,
-    MONTHLY_HISTORY,
-    MONTHLY_RECURRENCE,
-    ROOT,
-    YEARLY_CLASSIFICATION,
-)
+from stactools.jrc_gsw.executors import BACKENDS
+
+# The modules doing the work import rasterio, shapely, fsspec and numpy, so
+# they are imported inside the commands rather than at plugin registration.
 
 logger = logging.getLogger(__name__)
 
@@ -34,15 +30,31 @@ def create_jrc_gsw_command(cli):
         required=True,
         help="The output directory for the root STAC Collection json.",
     )
-    def create_collection_command(destination: str):
+    @click.option(
+        "--summaries",
+        is_flag=True,
+        help="Link the class area sidecars written by create-items --summaries.",
+    )
+    def create_collection_command(destination: str, summaries: bool):
         """Creates a STAC Collection for each mapped dataset from the European Commission
         Joint Research Centre - Global Surface Water program.
 
         Args:
             destination (str): Directory used to store the root STAC collection.
+            summaries (bool): Link class area sidecars from the collections.
         Returns:
             Callable
         """
+        from stactools.jrc_gsw import stac
+        from stactools.jrc_gsw.collections import (
+            AGGREGATED,
+            MONTHLY_HISTORY,
+            MONTHLY_RECURRENCE,
+            ROOT,
+            YEARLY_CLASSIFICATION,
+        )
+        from stactools.jrc_gsw.assets import CLASS_AREAS_FILENAME, SUMMARY_ASSETS
+
         root_col = stac.create_collection(ROOT)
 
         for collection in [
@@ -51,7 +63,10 @@ def create_jrc_gsw_command(cli):
             MONTHLY_RECURRENCE,
             YEARLY_CLASSIFICATION,
         ]:
-            col = stac.create_collection(collection)
+            class_areas_href = None
+            if summaries and collection["ID"] in SUMMARY_ASSETS:
+                class_areas_href = f"./{CLASS_AREAS_FILENAME}"
+            col = stac.create_collection(collection, class_areas_href)
             col.normalize_hrefs(destination)
             col.save()
             col.validate()
@@ -77,7 +92,25 @@ def create_jrc_gsw_command(cli):
         required=True,
         help="The path to the COG.",
     )
-    def create_item_command(destination: str, source: str):
+    @click.option(
+        "-v",
+        "--version",
+        "versions",
+        multiple=True,
+        help=(
+            "Version directory to catalog, e.g. VER3-0. Repeat, oldest first, "
+            "to create linked items for several versions in one pass."
+        ),
+    )
+    @click.option(
+        "--source-version",
+        default="LATEST",
+        show_default=True,
+        help="The version directory of the source COG.",
+    )
+    def create_item_command(
+        destination: str, source: str, versions: tuple, source_version: str
+    ):
         """Creates a STAC Item
 
         Args:
@@ -85,11 +118,454 @@ def create_jrc_gsw_command(cli):
             source (str): The root data directory. Must follow the
                           structure found in:
                           http://jeodpp.jrc.ec.europa.eu/ftp/jrc-opendata/GSWE/
+            versions (tuple): Version directories to catalog. Items are
+                          written to one subdirectory per version.
+            source_version (str): The version directory of the source COG.
         """
+        from stactools.jrc_gsw import stac
+
+        if versions:
+            items = stac.create_versioned_items(
+                source, destination, list(versions), source_version
+            )
+            for item in items:
+                item.save_object()
+                item.validate()
+            return
+
         item = stac.create_item(source, destination)
         item_path = os.path.join(destination, f"{item.id}.json")
         item.set_self_href(item_path)
         item.save_object()
         item.validate()
 
+    @jrc_gsw.command(
+        "create-items",
+        short_help="Create STAC items for every COG in a data directory.",
+    )
+    @click.option(
+        "-d",
+        "--destination",
+        required=True,
+        help="The output directory. Items are written to one subdirectory per collection.",  # noqa
+    )
+    @click.option(
+        "-s",
+        "--source",
+        required=True,
+        help="The root data directory.",
+    )
+    @click.option(
+        "--downloaded-version",
+        default="LATEST",
+        show_default=True,
+        help="The version directory to catalog.",
+    )
+    @click.option(
+        "--data-version",
+        default="VER4-0",
+        show_default=True,
+        help="The version of the data.",
+    )
+    @click.option(
+        "-b",
+        "--backend",
+        type=click.Choice(BACKENDS),
+        default="process",
+        show_default=True,
+        help="Where to run the work.",
+    )
+    @click.option(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of local workers. Defaults to the number of CPUs.",
+    )
+    @click.option(
+        "--scheduler-address",
+        help="Address of a running Dask scheduler, for the dask backend.",
+    )
+    @click.option(
+        "--partition-size",
+        type=int,
+        help="Maximum number of COGs per work partition.",
+    )
+    @click.option(
+        "--summaries",
+        is_flag=True,
+        help=("Also write a class area sidecar per collection. Requires pyarrow."),
+    )
+    @click.option(
+        "--collections",
+        is_flag=True,
+        help=(
+            "Also write the root and per-collection STAC Collections, with "
+            "extents and summaries computed from the items and links to them."
+        ),
+    )
+    @click.option(
+        "--vectors",
+        "vector_format",
+        type=click.Choice(["flatgeobuf", "geoparquet"]),
+        help=(
+            "Also polygonize the aggregated extent and yearly permanent water "
+            "masks into vector assets in this format."
+        ),
+    )
+    @click.option(
+        "--simplify-tolerance",
+        type=float,
+        help=(
+            "Tolerance, in degrees, with which polygons are simplified. "
+            "Polygons on the tile edge are left exact."
+        ),
+    )
+    @click.option(
+        "--max-concurrency",
+        type=int,
+        default=16,
+        show_default=True,
+        help=(
+            "Maximum concurrent reads per host and worker for remote sources. "
+            "Lowered automatically while the server throttles requests."
+        ),
+    )
+    @click.option(
+        "--rate-limit",
+        type=float,
+        help="Maximum requests per second per host and worker for remote sources.",
+    )
+    @click.option(
+        "--max-retries",
+        type=int,
+        default=5,
+        show_default=True,
+        help="Retries of throttled (HTTP 429/503) or failed remote reads.",
+    )
+    @click.option(
+        "--dedup",
+        is_flag=True,
+        help=(
+            "Hash each COG's pixels, flag constant and all-nodata items, and "
+            "point assets with identical pixels at a single canonical COG."
+        ),
+    )
+    @click.option(
+        "--skip-empty",
+        is_flag=True,
+        help=(
+            "With --dedup, do not write items that are entirely no data, nor "
+            "their vectors and class area summaries. Only "
+            "monthly history and yearly classification items can be empty, as "
+            "the other assets have no known no data value."
+        ),
+    )
+    def create_items_command(
+        destination: str,
+        source: str,
+        downloaded_version: str,
+        data_version: str,
+        backend: str,
+        workers: int,
+        scheduler_address: str,
+        partition_size: int,
+        summaries: bool,
+        collections: bool,
+        vector_format: str,
+        simplify_tolerance: float,
+        max_concurrency: int,
+        rate_limit: float,
+        max_retries: int,
+        dedup: bool,
+        skip_empty: bool,
+    ):
+        """Creates STAC Items for every COG in a JRC-GSW data directory.
+
+        Args:
+            destination (str): The output directory.
+            source (str): The root data directory. Must follow the
+                          structure found in:
+                          http://jeodpp.jrc.ec.europa.eu/ftp/jrc-opendata/GSWE/
+        """
+        from stactools.jrc_gsw import bulk
+        from stactools.jrc_gsw.assets import CLASS_AREAS_FILENAME, SUMMARY_ASSETS
+        from stactools.jrc_gsw.dedup import DedupIndex
+        from stactools.jrc_gsw.executors import get_executor
+        from stactools.jrc_gsw.summaries import SummaryWriter
+
+        sources = bulk.find_sources(source, downloaded_version)
+        logger.info(f"Found {len(sources)} COGs in {source}")
+
+        if skip_empty and not dedup:
+            raise click.UsageError("--skip-empty requires --dedup")
+
+        summary_writer = SummaryWriter(destination) if summaries else None
+        dedup_index = DedupIndex() if dedup else None
+        finalizers = {}
+
+        with get_executor(backend, workers, scheduler_address) as executor:
+            for batch in bulk.create_items(
+                sources,
+                destination,
+                executor,
+                downloaded_version=downloaded_version,
+                data_version=data_version,
+                max_partition_size=partition_size,
+                summarize=summaries,
+                vector_format=vector_format,
+                simplify_tolerance=simplify_tolerance,
+                io_options={
+                    "max_concurrency": max_concurrency,
+                    "rate_limit": rate_limit,
+                    "max_retries": max_retries,
+                },
+                deduplicate=dedup,
+                skip_empty=skip_empty,
+            ):
+                finalizer = None
+                if collections:
+                    if batch.collection_id not in finalizers:
+                        class_areas_href = None
+                        if summaries and batch.collection_id in SUMMARY_ASSETS:
+                            class_areas_href = f"./{CLASS_AREAS_FILENAME}"
+                        finalizers[batch.collection_id] = bulk.create_finalizer(
+                            batch.collection_id, destination, class_areas_href
+                        )
+                    finalizer = finalizers[batch.collection_id]
+
+                bulk.write_item_batch(
+                    batch, destination, finalizer, dedup_index, skip_empty
+                )
+                if summary_writer:
+                    summary_writer.write(batch.collection_id, batch.summaries)
+
+        if summary_writer:
+            summary_writer.close()
+
+        if dedup_index:
+            logger.info(f"Pointed {dedup_index.duplicates} duplicate assets at a copy")
+
+        if collections:
+            bulk.save_collections(finalizers.values(), destination)
+
+    @jrc_gsw.command(
+        "create-datacube",
+        short_help="Export MonthlyHistory items as a Zarr datacube per tile.",
+    )
+    @click.option(
+        "-d",
+        "--destination",
+        required=True,
+        help="The output directory for the Zarr stores and their STAC items.",
+    )
+    @click.option(
+        "-s",
+        "--source",
+        required=True,
+        help="The output directory of create-items.",
+    )
+    @click.option(
+        "-t",
+        "--tile",
+        "tiles",
+        multiple=True,
+        help="Tile to export, e.g. 0000360000-0000480000. Defaults to every tile.",
+    )
+    @click.option(
+        "--chunk-size",
+        type=int,
+        default=512,
+        show_default=True,
+        help="Spatial chunk size, in pixels. Chunks span the whole time axis.",
+    )
+    @click.option(
+        "-b",
+        "--backend",
+        type=click.Choice(BACKENDS),
+        default="process",
+        show_default=True,
+        help="Where to write the chunks.",
+    )
+    @click.option(
+        "-w",
+        "--workers",
+        type=int,
+        help="Number of local workers. Defaults to the number of CPUs.",
+    )
+    @click.option(
+        "--scheduler-address",
+        help="Address of a running Dask scheduler, for the dask backend.",
+    )
+    def create_datacube_command(
+        destination: str,
+        source: str,
+        tiles: tuple,
+        chunk_size: int,
+        backend: str,
+        workers: int,
+        scheduler_address: str,
+    ):
+        """Exports each tile's MonthlyHistory items as a (time, y, x) Zarr
+        datacube, with a STAC item using the datacube extension.
+
+        Args:
+            destination (str): The output directory.
+            source (str): The output directory of create-items.
+            tiles (tuple): Tiles to export. Defaults to every tile.
+            chunk_size (int): Spatial chunk size, in pixels.
+        """
+        from stactools.jrc_gsw.datacube import (
+            export_monthly_history,
+            find_monthly_history_items,
+            read_items,
+        )
+        from stactools.jrc_gsw.executors import get_executor
+
+        hrefs_by_tile = find_monthly_history_items(source)
+        for tile in tiles:
+            if tile not in hrefs_by_tile:
+                raise click.BadParameter(f"No MonthlyHistory items for tile {tile}")
+
+        with get_executor(backend, workers, scheduler_address) as executor:
+            for tile, hrefs in hrefs_by_tile.items():
+                if tiles and tile not in tiles:
+                    continue
+                items = read_items(hrefs)
+                item = export_monthly_history(items, destination, chunk_size, executor)
+                item.save_object()
+
+    @jrc_gsw.command(
+        "serve",
+        short_help="Serve generated items through a read-only STAC API.",
+    )
+    @click.option(
+        "-s",
+        "--source",
+        "sources",
+        required=True,
+        multiple=True,
+        help=(
+            "A directory written by create-items, or an .ndjson file with one "
+            "item per line. May be repeated."
+        ),
+    )
+    @click.option("--host", default="127.0.0.1", show_default=True)
+    @click.option("-p", "--port", type=int, default=8080, show_default=True)
+    @click.option(
+        "--cache-size",
+        type=int,
+        default=1024,
+        show_default=True,
+        help="Number of responses cached.",
+    )
+    @click.option(
+        "--block-cache-mb",
+        type=int,
+        default=256,
+        show_default=True,
+        help="Size, in MiB, of the COG blocks cached for /query.",
+    )
+    def serve_command(
+        sources: tuple, host: str, port: int, cache_size: int, block_cache_mb: int
+    ):
+        """Serves STAC Items through a local, read-only STAC API with
+        /search, paging and response caching, and water statistics of points
+        and polygons with /query.
+
+        Args:
+            sources (tuple): Directories and .ndjson files of items.
+            host (str): The host to listen on.
+            port (int): The port to listen on.
+            cache_size (int): Number of responses cached.
+            block_cache_mb (int): Size, in MiB, of the COG block cache.
+        """
+        from stactools.jrc_gsw.server import serve
+
+        serve(sources, host, port, cache_size, block_cache_mb * 2**20)
+
+    @jrc_gsw.command(
+        "query",
+        short_help="Compute water statistics of points and polygons.",
+    )
+    @click.option(
+        "-s",
+        "--source",
+        "sources",
+        required=True,
+        multiple=True,
+        help=(
+            "A directory written by create-items, or an .ndjson file with one "
+            "item per line. May be repeated."
+        ),
+    )
+    @click.option(
+        "-g",
+        "--geometry",
+        required=True,
+        help=(
+            "A GeoJSON geometry, Feature or FeatureCollection, as a string or "
+            "a file, or a lon,lat point."
+        ),
+    )
+    @click.option(
+        "--datetime",
+        "datetime_",
+        help="Only query items in this datetime or interval, e.g. 1984-01-01/..",
+    )
+    @click.option(
+        "-c",
+        "--collection",
+        "collections",
+        multiple=True,
+        help="Collection to query. Defaults to Aggregated, YearlyClassification "
+        "and MonthlyHistory.",
+    )
+    @click.option(
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        show_default=True,
+        help="Number of COGs read at once.",
+    )
+    def query_command(
+        sources: tuple,
+        geometry: str,
+        datetime_: str,
+        collections: tuple,
+        workers: int,
+    ):
+        """Prints, as JSON, the zonal water statistics of each geometry: the
+        class areas of categorical assets and the range and mean of the
+        others, for each period of each collection.
+
+        Args:
+            sources (tuple): Directories and .ndjson files of items.
+            geometry (str): The zones, as GeoJSON or a lon,lat point.
+            datetime_ (str): Datetime or interval of the items to query.
+            collections (tuple): Collections to query.
+            workers (int): Number of COGs read at once.
+        """
+        import json
+
+        from stactools.jrc_gsw.query import QueryEngine, read_geometries
+        from stactools.jrc_gsw.server import (
+            BadRequest,
+            ItemIndex,
+            parse_datetime,
+            parse_geometry,
+        )
+
+        try:
+            geometries = read_geometries(geometry)
+            for zone in geometries:
+                parse_geometry(zone)
+            interval = parse_datetime(datetime_) if datetime_ else None
+        except (BadRequest, ValueError) as e:
+            raise click.BadParameter(str(e))
+
+        engine = QueryEngine(ItemIndex.from_paths(sources), workers=workers)
+        results = engine.query_many(geometries, list(collections) or None, interval)
+        click.echo(json.dumps(results if len(results) > 1 else results[0], indent=2))
+
     return jrc_gsw
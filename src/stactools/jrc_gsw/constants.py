@@ -1,7 +1,4 @@
 # flake8: noqa
-import re
-
-from pyproj import CRS
 import pystac
 from pystac.utils import str_to_datetime
 
@@ -19,5 +16,10 @@ END_TIME = str_to_datetime("2020-12-31T11:59:59Z")
 
 EPSG = 4326
 
+# Version directories published by the JRC, oldest first. LATEST holds the
+# same data as the newest numbered version.
+DOWNLOADED_VERSIONS = ["VER1-0", "VER2-0", "VER3-0", "VER4-0"]
+LATEST_DATA_VERSION = "VER4-0"
+
 DOI = "10.1038/nature20584"
 CITATION = "Jean-Francois Pekel, Andrew Cottam, Noel Gorelick, Alan S. Belward, High-resolution mapping of global surface water and its long-term changes. Nature 540, 418-422 (2016)"
@@ -0,0 +1,385 @@
+import logging
+import os.path
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pystac
+import rasterio as rio
+from dateutil.relativedelta import relativedelta
+from pystac.extensions.datacube import DatacubeExtension, Dimension, Variable
+from pystac.extensions.projection import ProjectionExtension
+from pystac.extensions.scientific import ScientificExtension
+from pystac.extensions.version import ItemVersionExtension
+from rasterio.windows import Window
+
+from stactools.core.io import ReadHrefModifier
+from stactools.jrc_gsw.assets import (
+    DATACUBE_ASSETS,
+    MONTHLY_HISTORY_DATACUBE_KEY,
+    MONTHLY_HISTORY_KEY,
+)
+from stactools.jrc_gsw.collections import MONTHLY_HISTORY
+from stactools.jrc_gsw.constants import EPSG
+from stactools.jrc_gsw.executors import Executor, SerialExecutor
+from stactools.jrc_gsw.stac import use_fsspec
+
+logger = logging.getLogger(__name__)
+
+VARIABLE = "water"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# MonthlyHistory pixel values, of which 0 (no data) is the fill value: chunks
+# without any observation are not written.
+VALUES = [0, 1, 2]
+FLAG_MEANINGS = "no_data not_water water"
+
+# (row offset, column offset, height, width) of a spatial chunk.
+ChunkWindow = Tuple[int, int, int, int]
+
+
+def _import_zarr() -> Any:
+    try:
+        import zarr
+    except ImportError as e:
+        raise ImportError(
+            "Exporting datacubes requires zarr. "
+            "Install it with `pip install stactools-jrc-gsw[datacube]`."
+        ) from e
+    return zarr
+
+
+def _zarr_version(zarr: Any) -> int:
+    return int(zarr.__version__.split(".")[0])
+
+
+def _create_array(
+    group: Any,
+    name: str,
+    dimensions: Tuple[str, ...],
+    attributes: Dict[str, Any],
+    compress: bool = False,
+    **kwargs: Any,
+) -> Any:
+    """Creates an array in a Zarr group with zarr 3, or with zarr 2, which
+    stores dimension names as the ``_ARRAY_DIMENSIONS`` attribute read by
+    xarray.
+
+    Compressed arrays use zstd after a bit shuffle.
+    """
+    zarr = _import_zarr()
+    if _zarr_version(zarr) >= 3:
+        from zarr.codecs import BloscCodec
+
+        if compress:
+            kwargs["compressors"] = BloscCodec(
+                cname="zstd", clevel=5, shuffle="bitshuffle"
+            )
+        return group.create_array(
+            name, dimension_names=dimensions, attributes=attributes, **kwargs
+        )
+
+    from numcodecs import Blosc
+
+    if compress:
+        kwargs["compressor"] = Blosc(cname="zstd", clevel=5, shuffle=Blosc.BITSHUFFLE)
+    array = group.create_dataset(name, write_empty_chunks=False, **kwargs)
+    array.attrs.update(dict(attributes, _ARRAY_DIMENSIONS=list(dimensions)))
+    return array
+
+
+def chunk_rows(shape: Sequence[int], chunk_size: int) -> List[ChunkWindow]:
+    """Splits a raster of ``shape`` into rows of ``chunk_size`` square chunks,
+    as full-width windows."""
+    height, width = shape
+    return [
+        (row, 0, min(chunk_size, height - row), width)
+        for row in range(0, height, chunk_size)
+    ]
+
+
+def write_chunk_row(
+    window: ChunkWindow,
+    href: str,
+    sources: Sequence[str],
+    chunk_size: int,
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+) -> ChunkWindow:
+    """Reads a row of chunks from every month's COG and writes each chunk.
+
+    Each chunk spans the whole time axis, so it is written by exactly one
+    task and tasks never contend for a chunk. Every COG is opened once per
+    row, and only one chunk of every month is held in memory at a time.
+
+    Args:
+        window (tuple): (row offset, column offset, height, width) of the
+            row of chunks
+        href (str): path to the Zarr store
+        sources (Sequence[str]): the COG of each month, in time order
+        chunk_size (int): spatial chunk size, in pixels
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+
+    Returns:
+        tuple: The window written.
+    """
+    zarr = _import_zarr()
+
+    row, col_off, height, width = window
+    if _zarr_version(zarr) >= 3:
+        array = zarr.open_array(href, path=VARIABLE, mode="r+")
+    else:
+        # zarr 2 writes chunks of fill values unless told not to.
+        array = zarr.open_array(
+            href, path=VARIABLE, mode="r+", write_empty_chunks=False
+        )
+    with ExitStack() as stack:
+        datasets = [
+            stack.enter_context(
+                rio.open(read_href_modifier(source) if read_href_modifier else source)
+            )
+            for source in sources
+        ]
+        for col in range(col_off, col_off + width, chunk_size):
+            chunk_width = min(chunk_size, col_off + width - col)
+            data = np.zeros((len(sources), height, chunk_width), dtype=array.dtype)
+            for i, ds in enumerate(datasets):
+                ds.read(1, window=Window(col, row, chunk_width, height), out=data[i])
+            array[:, row : row + height, col : col + chunk_width] = data
+    return window
+
+
+def find_monthly_history_items(source: str) -> Dict[str, List[str]]:
+    """Finds the MonthlyHistory items written by ``create-items``, by tile,
+    from their filenames, ``<tile id>_<year>_<month>.json``, without reading
+    them.
+
+    Args:
+        source (str): the destination directory of ``create-items``
+
+    Returns:
+        Dict[str, List[str]]: item hrefs, by tile ID.
+    """
+    import fsspec
+
+    fs, path = fsspec.core.url_to_fs(os.path.join(source, MONTHLY_HISTORY["ID"]))
+    protocol = fs.protocol if isinstance(fs.protocol, str) else fs.protocol[0]
+
+    tiles: Dict[str, List[str]] = {}
+    for item_path in sorted(fs.glob(f"{path}/*.json")):
+        filename = os.path.basename(item_path)
+        if filename == "collection.json":
+            continue
+        if protocol not in ("file", "local"):
+            item_path = f"{protocol}://{item_path}"
+        tiles.setdefault(filename.rsplit("_", 2)[0], []).append(item_path)
+    return tiles
+
+
+def read_items(hrefs: Iterable[str]) -> List[pystac.Item]:
+    """Reads items, e.g. one tile's from :func:`find_monthly_history_items`."""
+    use_fsspec()
+    return [pystac.Item.from_file(href) for href in hrefs]
+
+
+def datacube_id(items: Sequence[pystac.Item]) -> str:
+    """The ID of a tile's datacube item, e.g. ``0000360000-0000480000_datacube``."""
+    return f"{items[0].id.rsplit('_', 2)[0]}_datacube"
+
+
+def export_monthly_history(
+    items: Sequence[pystac.Item],
+    destination: str,
+    chunk_size: int = 512,
+    executor: Optional[Executor] = None,
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+) -> pystac.Item:
+    """Exports a tile's MonthlyHistory items as a (time, y, x) Zarr datacube.
+
+    Chunks span the full time axis and ``chunk_size`` pixels in each spatial
+    dimension, so a pixel's time series is a single chunk read. The work is
+    split by row of spatial chunks; each task opens every month's COG once
+    and streams the months of one chunk at a time. Values are stored as
+    uint8, compressed with zstd after a bit shuffle, which packs their two
+    significant bits tightly. Chunks without any observation are not
+    written.
+
+    Requires zarr 2 or 3 (``pip install stactools-jrc-gsw[datacube]``); zarr
+    2 writes Zarr format 2 stores and zarr 3 format 3 stores.
+
+    Args:
+        items (Sequence[pystac.Item]): MonthlyHistory items of one tile, e.g.
+            from :func:`stactools.jrc_gsw.stac.create_item`
+        destination (str): directory to which ``<id>.zarr`` is written
+        chunk_size (int, optional): spatial chunk size, in pixels.
+            Default: 512.
+        executor (Executor, optional): where to write the chunks. Defaults to
+            the calling process.
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+
+    Returns:
+        pystac.Item: The datacube item, with its self href set to
+        ``<destination>/<id>.json``.
+    """
+    zarr = _import_zarr()
+
+    if not items:
+        raise ValueError("No MonthlyHistory items to export")
+    items = sorted(items, key=lambda item: item.properties["start_datetime"])
+
+    projection = ProjectionExtension.ext(items[0])
+    shape = projection.shape
+    transform = projection.transform
+    for item in items[1:]:
+        item_projection = ProjectionExtension.ext(item)
+        if item_projection.shape != shape or item_projection.transform != transform:
+            raise ValueError(f"Item {item.id} is not on the grid of {items[0].id}")
+
+    assets = [item.assets[MONTHLY_HISTORY_KEY] for item in items]
+    sources = [asset.get_absolute_href() or asset.href for asset in assets]
+    starts = [item.properties["start_datetime"] for item in items]
+    ends = [item.properties["end_datetime"] for item in items]
+
+    item_id = datacube_id(items)
+    href = os.path.join(destination, f"{item_id}.zarr")
+    height, width = shape
+
+    group = zarr.open_group(href, mode="w")
+    _create_array(
+        group,
+        VARIABLE,
+        ("time", "y", "x"),
+        {
+            "long_name": "Monthly water detection",
+            "flag_values": VALUES,
+            "flag_meanings": FLAG_MEANINGS,
+        },
+        compress=True,
+        shape=(len(items), height, width),
+        dtype="uint8",
+        chunks=(len(items), min(chunk_size, height), min(chunk_size, width)),
+        fill_value=0,
+    )
+    days = [(pystac.utils.str_to_datetime(start) - EPOCH).days for start in starts]
+    _create_array(
+        group,
+        "time",
+        ("time",),
+        {
+            "standard_name": "time",
+            "units": "days since 1970-01-01",
+            "calendar": "proleptic_gregorian",
+        },
+        data=np.array(days, dtype="int32"),
+    )
+    a, _, c, _, e, f = transform[:6]
+    for name, origin, step, size in [("x", c, a, width), ("y", f, e, height)]:
+        _create_array(
+            group,
+            name,
+            (name,),
+            {"units": "degrees", "crs": f"EPSG:{EPSG}"},
+            data=origin + (np.arange(size) + 0.5) * step,
+        )
+    group.attrs.update({"crs": f"EPSG:{EPSG}", "transform": list(transform[:6])})
+
+    windows = chunk_rows(shape, chunk_size)
+    logger.info(
+        f"Writing {len(windows)} rows of chunks of {len(items)} months to {href}"
+    )
+    executor = executor or SerialExecutor()
+    for _ in executor.map_unordered(
+        write_chunk_row,
+        windows,
+        href=href,
+        sources=sources,
+        chunk_size=chunk_size,
+        read_href_modifier=read_href_modifier,
+    ):
+        pass
+
+    item = create_datacube_item(items, f"./{item_id}.zarr", min(starts), max(ends))
+    item.set_self_href(os.path.join(destination, f"{item_id}.json"))
+    return item
+
+
+def _is_monthly(starts: Sequence[str]) -> bool:
+    dates = [pystac.utils.str_to_datetime(start) for start in starts]
+    return all(b == a + relativedelta(months=1) for a, b in zip(dates, dates[1:]))
+
+
+def create_datacube_item(
+    items: Sequence[pystac.Item], href: str, start: str, end: str
+) -> pystac.Item:
+    """Creates the STAC item of a datacube exported from ``items``, with the
+    datacube extension describing its dimensions and variable."""
+    first = items[0]
+    starts = sorted(item.properties["start_datetime"] for item in items)
+    transform = ProjectionExtension.ext(first).transform
+    bbox = first.bbox
+
+    item = pystac.Item(
+        id=datacube_id(items),
+        geometry=first.geometry,
+        bbox=bbox,
+        datetime=None,
+        properties={"start_datetime": start, "end_datetime": end},
+    )
+    for extension in (ProjectionExtension, ScientificExtension, ItemVersionExtension):
+        if extension.has_extension(first):
+            extension.add_to(item)
+    for key, value in first.properties.items():
+        if key.startswith(("proj:", "sci:")) or key == "version":
+            item.properties[key] = value
+
+    time: Dict[str, Any] = {
+        "type": "temporal",
+        "extent": [start, end],
+        "description": "Start of each month",
+    }
+    if _is_monthly(starts):
+        time["step"] = "P1M"
+    else:
+        time["values"] = starts
+
+    datacube = DatacubeExtension.ext(item, add_if_missing=True)
+    datacube.apply(
+        dimensions={
+            "time": Dimension.from_dict(time),
+            "y": Dimension.from_dict(
+                {
+                    "type": "spatial",
+                    "axis": "y",
+                    "extent": [bbox[1], bbox[3]],
+                    "step": transform[4],
+                    "reference_system": EPSG,
+                }
+            ),
+            "x": Dimension.from_dict(
+                {
+                    "type": "spatial",
+                    "axis": "x",
+                    "extent": [bbox[0], bbox[2]],
+                    "step": transform[0],
+                    "reference_system": EPSG,
+                }
+            ),
+        },
+        variables={
+            VARIABLE: Variable(
+                {
+                    "type": "data",
+                    "dimensions": ["time", "y", "x"],
+                    "description": "0: No data, 1: Not water, 2: Water",
+                    "values": VALUES,
+                }
+            )
+        },
+    )
+
+    asset = DATACUBE_ASSETS[MONTHLY_HISTORY["ID"]][
+        MONTHLY_HISTORY_DATACUBE_KEY
+    ].create_asset(href)
+    item.add_asset(MONTHLY_HISTORY_DATACUBE_KEY, asset)
+
+    return item
@@ -0,0 +1,268 @@
+import hashlib
+import json
+import logging
+import os.path
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import pystac
+import rasterio as rio
+from pystac.utils import is_absolute_href, make_absolute_href, make_relative_href
+from rasterio.windows import Window
+
+from stactools.core.io import ReadHrefModifier
+from stactools.jrc_gsw import scheduler, stac
+from stactools.jrc_gsw.assets import MONTHLY_HISTORY_KEY, YEARLY_CLASSIFICATION_KEY
+
+logger = logging.getLogger(__name__)
+
+PIXEL_HASH = "jrc_gsw:pixel_hash"
+CONSTANT_VALUE = "jrc_gsw:constant_value"
+ALL_NODATA = "jrc_gsw:all_nodata"
+CONSTANT = "jrc_gsw:constant"
+FILE_SIZE = "file:size"
+
+# The COGs do not declare a nodata value; these assets use 0 for "No data".
+NODATA_VALUES = {MONTHLY_HISTORY_KEY: 0, YEARLY_CLASSIFICATION_KEY: 0}
+
+# Height of the bands of rows hashed separately. Bands do not depend on a
+# COG's internal tiling, so differently tiled copies share a digest.
+BAND_HEIGHT = 512
+
+
+@dataclass
+class PixelDigest:
+    """A hash of a raster's pixels and grid, with its value range."""
+
+    digest: str
+    minimum: Any
+    maximum: Any
+    nodata: Optional[Any] = None
+
+    @property
+    def constant(self) -> bool:
+        return bool(self.minimum == self.maximum)
+
+    @property
+    def all_nodata(self) -> bool:
+        return self.constant and self.nodata is not None and self.minimum == self.nodata
+
+
+class ThreadDatasets:
+    """Opens a COG once per thread, on first use, so that the bands of rows
+    read by a thread share one dataset and, for remote COGs, one session."""
+
+    def __init__(self, href: str):
+        self.href = href
+        self.local = threading.local()
+        self.datasets: List[Any] = []
+        self.lock = threading.Lock()
+
+    def get(self) -> Any:
+        dataset = getattr(self.local, "dataset", None)
+        if dataset is None:
+            dataset = rio.open(self.href)
+            self.local.dataset = dataset
+            with self.lock:
+                self.datasets.append(dataset)
+        return dataset
+
+    def close(self) -> None:
+        for dataset in self.datasets:
+            dataset.close()
+        self.datasets = []
+
+
+def _read_header(href: str) -> Tuple[Dict[str, Any], List[Window], Any]:
+    with rio.Env(**stac.remote_read_options(href)), rio.open(href) as ds:
+        header = {
+            "dtypes": list(ds.dtypes),
+            "shape": [ds.count, ds.height, ds.width],
+            "crs": ds.crs.to_string() if ds.crs else None,
+            "transform": list(ds.transform)[:6],
+        }
+        windows = [
+            Window(0, row, ds.width, min(BAND_HEIGHT, ds.height - row))
+            for row in range(0, ds.height, BAND_HEIGHT)
+        ]
+        return header, windows, ds.nodata
+
+
+def _read_band(datasets: ThreadDatasets, window: Window) -> Any:
+    with rio.Env(**stac.remote_read_options(datasets.href)):
+        return datasets.get().read(window=window)
+
+
+def _hash_band(datasets: ThreadDatasets, window: Window) -> Tuple[bytes, Any, Any]:
+    band = scheduler.get_scheduler().call(datasets.href, _read_band, datasets, window)
+    digest = hashlib.blake2b(band.tobytes(), digest_size=16).digest()
+    return digest, band.min(), band.max()
+
+
+def hash_pixels(
+    href: str,
+    nodata: Optional[Any] = None,
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+    workers: int = 4,
+) -> PixelDigest:
+    """Hashes the pixels of a COG, one band of rows at a time.
+
+    Bands of ``BAND_HEIGHT`` rows are read and hashed in parallel threads, and
+    their digests are combined in order, so the result does not depend on
+    scheduling. Each thread opens the COG once, and remote reads go through
+    the :mod:`stactools.jrc_gsw.scheduler`. At most ``workers`` bands are
+    held in memory. The digest
+    also covers the data type, shape, CRS and transform, so two COGs share a
+    digest only if they are interchangeable, e.g. the same tile in different
+    periods or versions, regardless of how they are tiled or compressed.
+
+    Args:
+        href (str): path to the COG
+        nodata (optional): the no data value, if the COG does not declare one
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+        workers (int, optional): number of threads. Default: 4.
+
+    Returns:
+        PixelDigest: The digest and the range of the pixel values.
+    """
+    if read_href_modifier:
+        href = read_href_modifier(href)
+
+    header, windows, declared_nodata = scheduler.get_scheduler().call(
+        href, _read_header, href
+    )
+    if declared_nodata is not None:
+        nodata = declared_nodata
+
+    digest = hashlib.blake2b(json.dumps(header).encode("utf-8"), digest_size=16)
+    minimum = maximum = None
+    datasets = ThreadDatasets(href)
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            # Submit a bounded number of bands ahead of the one being combined.
+            pending: Deque[Future] = deque()
+            for window in windows:
+                pending.append(pool.submit(_hash_band, datasets, window))
+                if len(pending) > workers:
+                    minimum, maximum = _combine(
+                        digest, pending.popleft(), minimum, maximum
+                    )
+            while pending:
+                minimum, maximum = _combine(digest, pending.popleft(), minimum, maximum)
+    finally:
+        datasets.close()
+
+    return PixelDigest(
+        digest.hexdigest(),
+        None if minimum is None else minimum.item(),
+        None if maximum is None else maximum.item(),
+        nodata,
+    )
+
+
+def _combine(
+    digest: Any, future: Future, minimum: Any, maximum: Any
+) -> Tuple[Any, Any]:
+    band_digest, band_min, band_max = future.result()
+    digest.update(band_digest)
+    if minimum is None:
+        return band_min, band_max
+    return min(minimum, band_min), max(maximum, band_max)
+
+
+def flag_item(
+    item: pystac.Item,
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+    workers: int = 4,
+) -> pystac.Item:
+    """Hashes the pixels of an item's COG assets and flags empty items.
+
+    Each COG asset gets its pixel digest as ``jrc_gsw:pixel_hash`` and, if
+    every pixel has the same value, that value as ``jrc_gsw:constant_value``.
+    The item gets ``jrc_gsw:constant``, true if every asset is constant, and
+    ``jrc_gsw:all_nodata``, true if every asset is entirely no data.
+
+    Args:
+        item (pystac.Item): an item, e.g. from
+            :func:`stactools.jrc_gsw.stac.create_item`, whose asset hrefs can
+            be resolved
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+        workers (int, optional): number of threads per COG. Default: 4.
+
+    Returns:
+        pystac.Item: The item, updated in place.
+    """
+    digests = []
+    for key, asset in item.assets.items():
+        if asset.media_type != pystac.MediaType.COG:
+            continue
+        digest = hash_pixels(
+            asset.get_absolute_href() or asset.href,
+            NODATA_VALUES.get(key),
+            read_href_modifier,
+            workers,
+        )
+        asset.extra_fields[PIXEL_HASH] = digest.digest
+        if digest.constant:
+            asset.extra_fields[CONSTANT_VALUE] = digest.minimum
+        digests.append(digest)
+
+    if digests:
+        item.properties[CONSTANT] = all(digest.constant for digest in digests)
+        item.properties[ALL_NODATA] = all(digest.all_nodata for digest in digests)
+    return item
+
+
+def is_empty(item: Dict[str, Any]) -> bool:
+    """Whether an item dictionary was flagged as entirely no data."""
+    return bool(item["properties"].get(ALL_NODATA))
+
+
+class DedupIndex:
+    """Points assets with identical pixels at a single canonical href.
+
+    The first asset seen with a pixel digest becomes its canonical copy, and
+    the hrefs of later assets with that digest are replaced by the canonical
+    href, made relative to their item. Their ``file:size`` is replaced by the
+    canonical file's, or dropped if it is unknown.
+    """
+
+    def __init__(self) -> None:
+        self.canonical: Dict[str, Tuple[str, Optional[int]]] = {}
+        self.duplicates = 0
+
+    def apply(self, item: Dict[str, Any], href: str) -> int:
+        """Rewrites the duplicate assets of an item dictionary.
+
+        Args:
+            item (dict): an item dictionary flagged by :func:`flag_item`
+            href (str): where the item will be saved
+
+        Returns:
+            int: The number of assets rewritten.
+        """
+        rewritten = 0
+        for asset in item["assets"].values():
+            digest = asset.get(PIXEL_HASH)
+            if digest is None:
+                continue
+            asset_href = asset["href"]
+            if not is_absolute_href(asset_href):
+                asset_href = os.path.normpath(make_absolute_href(asset_href, href))
+            canonical, size = self.canonical.setdefault(
+                digest, (asset_href, asset.get(FILE_SIZE))
+            )
+            if canonical != asset_href:
+                if not stac.uri_validator(canonical):
+                    canonical = make_relative_href(canonical, href)
+                asset["href"] = canonical
+                if size is None:
+                    asset.pop(FILE_SIZE, None)
+                else:
+                    asset[FILE_SIZE] = size
+                rewritten += 1
+        self.duplicates += rewritten
+        return rewritten
@@ -0,0 +1,152 @@
+import logging
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ["serial", "process", "dask"]
+
+
+class Executor(ABC):
+    """Runs a function over work partitions and yields results as they finish.
+
+    Results are yielded in completion order, not submission order, so callers
+    can stream them to disk while the remaining partitions are still running.
+    """
+
+    @abstractmethod
+    def map_unordered(
+        self, fn: Callable[..., Any], partitions: Iterable[Any], **kwargs: Any
+    ) -> Iterator[Any]:
+        """Yields ``fn(partition, **kwargs)`` for each partition."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "Executor":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class SerialExecutor(Executor):
+    """Runs every partition in the calling process."""
+
+    def map_unordered(
+        self, fn: Callable[..., Any], partitions: Iterable[Any], **kwargs: Any
+    ) -> Iterator[Any]:
+        for partition in partitions:
+            yield fn(partition, **kwargs)
+
+
+class ProcessExecutor(Executor):
+    """Runs partitions on a local pool of worker processes.
+
+    Args:
+        workers (int, optional): Number of worker processes. Defaults to the
+            number of CPUs.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+
+    def map_unordered(
+        self, fn: Callable[..., Any], partitions: Iterable[Any], **kwargs: Any
+    ) -> Iterator[Any]:
+        futures = [
+            self.pool.submit(fn, partition, **kwargs) for partition in partitions
+        ]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Partitions not started yet are dropped if a partition fails or
+            # the caller stops early, rather than run before shutdown.
+            for future in futures:
+                future.cancel()
+
+    def close(self) -> None:
+        self.pool.shutdown()
+
+
+class DaskExecutor(Executor):
+    """Runs partitions on a Dask distributed cluster.
+
+    Args:
+        address (str, optional): Address of a running Dask scheduler. If
+            neither ``address`` nor ``client`` is given, a ``LocalCluster`` is
+            started with ``workers`` worker processes.
+        client (dask.distributed.Client, optional): An existing client. It is
+            left open when the executor is closed.
+        workers (int, optional): Number of workers for the local cluster.
+    """
+
+    def __init__(
+        self,
+        address: Optional[str] = None,
+        client: Optional[Any] = None,
+        workers: Optional[int] = None,
+    ):
+        try:
+            from dask.distributed import Client
+        except ImportError as e:
+            raise ImportError(
+                "The dask backend requires dask.distributed. "
+                "Install it with `pip install stactools-jrc-gsw[dask]`."
+            ) from e
+
+        self._owns_client = client is None
+        if client is not None:
+            self.client = client
+        elif address is not None:
+            self.client = Client(address)
+        else:
+            self.client = Client(n_workers=workers, processes=True)
+
+    def map_unordered(
+        self, fn: Callable[..., Any], partitions: Iterable[Any], **kwargs: Any
+    ) -> Iterator[Any]:
+        from dask.distributed import as_completed as dask_as_completed
+
+        # Bound first, so that keyword arguments of ``fn`` named like those of
+        # ``Client.map``, e.g. ``workers`` or ``key``, reach ``fn``.
+        futures = self.client.map(partial(fn, **kwargs), list(partitions), pure=False)
+        try:
+            for future in dask_as_completed(futures):
+                result = future.result()
+                future.release()
+                yield result
+        finally:
+            self.client.cancel([future for future in futures if not future.done()])
+
+    def close(self) -> None:
+        if self._owns_client:
+            self.client.close()
+
+
+def get_executor(
+    backend: str = "process",
+    workers: Optional[int] = None,
+    address: Optional[str] = None,
+) -> Executor:
+    """Creates an executor by backend name.
+
+    Args:
+        backend (str): One of ``serial``, ``process`` or ``dask``.
+        workers (int, optional): Number of workers for local backends.
+        address (str, optional): Dask scheduler address.
+
+    Returns:
+        Executor: The executor.
+    """
+    logger.info(f"Using the {backend} executor backend")
+    if backend == "serial":
+        return SerialExecutor()
+    elif backend == "process":
+        return ProcessExecutor(workers)
+    elif backend == "dask":
+        return DaskExecutor(address=address, workers=workers)
+    raise ValueError(f"Unknown executor backend: {backend}")
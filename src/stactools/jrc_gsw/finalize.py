@@ -0,0 +1,153 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+import pystac
+from pystac.utils import make_relative_href, str_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Item properties whose distinct values are summarized in the collection.
+SUMMARY_PROPERTIES = ["version", "proj:epsg", "proj:code"]
+
+
+class CollectionFinalizer:
+    """Folds items into a collection as they are produced.
+
+    The collection's spatial and temporal extents, its summaries and its item
+    links are accumulated from item dictionaries, so items never need to be
+    held in memory or read back from disk. Item links are added to the
+    collection in batches.
+
+    Args:
+        collection (pystac.Collection): The collection, e.g. from
+            :func:`stactools.jrc_gsw.stac.create_collection`. Its self href is
+            set to ``collection_href``.
+        collection_href (str): Where the collection will be saved.
+        root_href (str, optional): Where the root catalog will be saved, for
+            the root links of the items.
+        link_batch_size (int, optional): Number of item links buffered before
+            they are added to the collection.
+    """
+
+    def __init__(
+        self,
+        collection: pystac.Collection,
+        collection_href: str,
+        root_href: Optional[str] = None,
+        link_batch_size: int = 1000,
+    ):
+        self.collection = collection
+        self.collection.set_self_href(collection_href)
+        self.root_href = root_href or collection_href
+        self.link_batch_size = link_batch_size
+
+        self.count = 0
+        self.bbox: Optional[List[float]] = None
+        self.start_datetime: Optional[datetime] = None
+        self.end_datetime: Optional[datetime] = None
+        self.values: Dict[str, Set[Any]] = {}
+        self.file_size: Optional[List[int]] = None
+        self._links: List[str] = []
+
+    def add(self, item: Dict[str, Any], href: str) -> None:
+        """Folds an item into the collection.
+
+        The item dictionary is updated in place with its collection id and its
+        collection, parent and root links, so it should be written after it
+        has been added.
+
+        Args:
+            item (dict): The item dictionary.
+            href (str): Where the item will be saved.
+        """
+        self.count += 1
+
+        bbox = item["bbox"]
+        if self.bbox is None:
+            self.bbox = list(bbox)
+        else:
+            self.bbox = [
+                min(self.bbox[0], bbox[0]),
+                min(self.bbox[1], bbox[1]),
+                max(self.bbox[2], bbox[2]),
+                max(self.bbox[3], bbox[3]),
+            ]
+
+        properties = item["properties"]
+        start = properties.get("start_datetime") or properties["datetime"]
+        end = properties.get("end_datetime") or properties["datetime"]
+        start_datetime = str_to_datetime(start)
+        end_datetime = str_to_datetime(end)
+        if self.start_datetime is None or start_datetime < self.start_datetime:
+            self.start_datetime = start_datetime
+        if self.end_datetime is None or end_datetime > self.end_datetime:
+            self.end_datetime = end_datetime
+
+        for key in SUMMARY_PROPERTIES:
+            if key in properties:
+                self.values.setdefault(key, set()).add(properties[key])
+
+        for asset in item["assets"].values():
+            size = asset.get("file:size")
+            if size is None:
+                continue
+            if self.file_size is None:
+                self.file_size = [size, size]
+            else:
+                self.file_size = [
+                    min(self.file_size[0], size),
+                    max(self.file_size[1], size),
+                ]
+
+        collection_href = make_relative_href(self.collection.get_self_href(), href)
+        root_href = make_relative_href(self.root_href, href)
+        item["collection"] = self.collection.id
+        item["links"] = [
+            link
+            for link in item.get("links", [])
+            if link["rel"] not in ("collection", "parent", "root")
+        ] + [
+            {"rel": "collection", "href": collection_href, "type": "application/json"},
+            {"rel": "parent", "href": collection_href, "type": "application/json"},
+            {"rel": "root", "href": root_href, "type": "application/json"},
+        ]
+
+        self._links.append(href)
+        if len(self._links) >= self.link_batch_size:
+            self._flush_links()
+
+    def _flush_links(self) -> None:
+        self.collection.add_links(
+            [
+                pystac.Link(pystac.RelType.ITEM, href, media_type=pystac.MediaType.JSON)
+                for href in self._links
+            ]
+        )
+        self._links = []
+
+    def finalize(self) -> pystac.Collection:
+        """Sets the collection's extents and summaries from the items added.
+
+        Returns:
+            pystac.Collection: The collection, with links to every item.
+        """
+        self._flush_links()
+        logger.info(f"Finalizing {self.collection.id} with {self.count} items")
+
+        if self.count == 0:
+            return self.collection
+
+        self.collection.extent = pystac.Extent(
+            pystac.SpatialExtent([self.bbox]),
+            pystac.TemporalExtent([[self.start_datetime, self.end_datetime]]),
+        )
+
+        for key, values in self.values.items():
+            self.collection.summaries.add(key, sorted(values))
+        if self.file_size is not None:
+            self.collection.summaries.add(
+                "file:size", pystac.RangeSummary(*self.file_size)
+            )
+
+        return self.collection
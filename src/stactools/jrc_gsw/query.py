@@ -0,0 +1,583 @@
+import json
+import logging
+import math
+import os.path
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import rasterio as rio
+from affine import Affine
+from rasterio import windows
+from rasterio.features import geometry_mask
+from rasterio.windows import Window
+from shapely.geometry import box, mapping, shape
+from shapely.geometry.base import BaseGeometry
+
+from stactools.core.io import ReadHrefModifier
+from stactools.jrc_gsw import scheduler, stac
+from stactools.jrc_gsw.assets import (
+    CHANGE_KEY,
+    EXTENT_KEY,
+    MONTHLY_HISTORY_KEY,
+    OCCURRENCE_KEY,
+    RECURRENCE_KEY,
+    SEASONALITY_KEY,
+    TRANSITIONS_KEY,
+    YEARLY_CLASSIFICATION_KEY,
+)
+from stactools.jrc_gsw.collections import (
+    AGGREGATED,
+    MONTHLY_HISTORY,
+    YEARLY_CLASSIFICATION,
+)
+from stactools.jrc_gsw.server import (
+    DEFAULT_BLOCK_CACHE_SIZE,
+    MAX_LIMIT,
+    IndexEntry,
+    ItemIndex,
+)
+from stactools.jrc_gsw.summaries import row_areas
+
+logger = logging.getLogger(__name__)
+
+# Assets read by queries, per collection.
+QUERY_ASSETS = {
+    AGGREGATED["ID"]: [
+        OCCURRENCE_KEY,
+        RECURRENCE_KEY,
+        SEASONALITY_KEY,
+        CHANGE_KEY,
+        TRANSITIONS_KEY,
+        EXTENT_KEY,
+    ],
+    YEARLY_CLASSIFICATION["ID"]: [YEARLY_CLASSIFICATION_KEY],
+    MONTHLY_HISTORY["ID"]: [MONTHLY_HISTORY_KEY],
+}
+
+# Valid values of the continuous assets. Values outside these ranges are
+# codes, e.g. 253 ("not water") in change or 255 (no data), and are counted
+# separately from the statistics.
+VALID_RANGES = {
+    OCCURRENCE_KEY: (0, 100),
+    RECURRENCE_KEY: (0, 100),
+    SEASONALITY_KEY: (0, 12),
+    CHANGE_KEY: (0, 200),
+}
+
+BlockKey = Tuple[str, int, int]
+
+
+class RasterInfo(NamedTuple):
+    """The grid and internal tiling of a COG."""
+
+    transform: Affine
+    width: int
+    height: int
+    block_height: int
+    block_width: int
+    dtype: str
+
+
+# Collection ID, asset key, start and end datetimes of the statistics of an
+# asset. Statistics of the tiles of one period are summed.
+Period = Tuple[str, str, Optional[str], Optional[str]]
+
+# Zone, period, pixel counts and areas of the values of one read.
+Histogram = Tuple[int, Period, np.ndarray, np.ndarray]
+
+
+class QueryItem(NamedTuple):
+    """The fields of an item needed by queries."""
+
+    collection_id: str
+    footprint: BaseGeometry
+    hrefs: Dict[str, str]
+    start: Optional[str]
+    end: Optional[str]
+
+
+class Read(NamedTuple):
+    """A window of one COG asset of an item, and the blocks covering it."""
+
+    period: Period
+    href: str
+    info: RasterInfo
+    window: Window
+    blocks: List[BlockKey]
+
+
+class BlockCache:
+    """A thread-safe LRU cache of decoded COG blocks, keyed by href and
+    block row and column.
+
+    Args:
+        max_bytes (int, optional): Total size of the cached blocks.
+            Default: 256 MiB.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_BLOCK_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.blocks: "OrderedDict[BlockKey, np.ndarray]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: BlockKey) -> Optional[np.ndarray]:
+        with self.lock:
+            block = self.blocks.get(key)
+            if block is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.blocks.move_to_end(key)
+            return block
+
+    def put(self, key: BlockKey, block: np.ndarray) -> None:
+        with self.lock:
+            previous = self.blocks.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous.nbytes
+            self.blocks[key] = block
+            self.nbytes += block.nbytes
+            while self.nbytes > self.max_bytes and self.blocks:
+                _, evicted = self.blocks.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+
+def read_raster_info(href: str) -> RasterInfo:
+    with rio.Env(**stac.remote_read_options(href)), rio.open(href) as ds:
+        block_height, block_width = ds.block_shapes[0]
+        return RasterInfo(
+            ds.transform,
+            ds.width,
+            ds.height,
+            block_height,
+            block_width,
+            ds.dtypes[0],
+        )
+
+
+def read_blocks(href: str, blocks: List[BlockKey]) -> Dict[BlockKey, np.ndarray]:
+    """Reads blocks of a COG, opening it once."""
+    with rio.Env(**stac.remote_read_options(href)), rio.open(href) as ds:
+        return {
+            block: ds.read(1, window=ds.block_window(1, block[1], block[2]))
+            for block in blocks
+        }
+
+
+def pixel_window(bounds: Tuple[float, ...], info: RasterInfo) -> Optional[Window]:
+    """Returns the window of the pixels touching ``bounds``, or None if
+    ``bounds`` are outside the raster.
+
+    The window has a margin of one pixel, so that geometries on pixel edges,
+    e.g. points, are masked the same way whichever way they round.
+    """
+    transform = info.transform
+    min_x, min_y, max_x, max_y = bounds
+    col_start = max(0, math.floor((min_x - transform.c) / transform.a) - 1)
+    col_stop = min(info.width, math.floor((max_x - transform.c) / transform.a) + 2)
+    row_start = max(0, math.floor((max_y - transform.f) / transform.e) - 1)
+    row_stop = min(info.height, math.floor((min_y - transform.f) / transform.e) + 2)
+    if col_start >= col_stop or row_start >= row_stop:
+        return None
+    return Window(col_start, row_start, col_stop - col_start, row_stop - row_start)
+
+
+def covering_blocks(href: str, window: Window, info: RasterInfo) -> List[BlockKey]:
+    rows = range(
+        window.row_off // info.block_height,
+        (window.row_off + window.height - 1) // info.block_height + 1,
+    )
+    cols = range(
+        window.col_off // info.block_width,
+        (window.col_off + window.width - 1) // info.block_width + 1,
+    )
+    return [(href, row, col) for row in rows for col in cols]
+
+
+def mosaic(read: Read, blocks: Dict[BlockKey, np.ndarray]) -> np.ndarray:
+    """Assembles the pixels of a read's window from its blocks."""
+    window = read.window
+    info = read.info
+    data = np.zeros((window.height, window.width), dtype=info.dtype)
+    for key in read.blocks:
+        block = blocks[key]
+        row_off = key[1] * info.block_height
+        col_off = key[2] * info.block_width
+        top = max(row_off, window.row_off)
+        bottom = min(row_off + block.shape[0], window.row_off + window.height)
+        left = max(col_off, window.col_off)
+        right = min(col_off + block.shape[1], window.col_off + window.width)
+        data[
+            top - window.row_off : bottom - window.row_off,
+            left - window.col_off : right - window.col_off,
+        ] = block[top - row_off : bottom - row_off, left - col_off : right - col_off]
+    return data
+
+
+def histogram(
+    data: np.ndarray, mask: np.ndarray, areas: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns the pixel count and the area, in km², of each value of the
+    masked pixels."""
+    values = data[mask]
+    size = np.iinfo(data.dtype).max + 1
+    weights = np.broadcast_to(areas[:, np.newaxis], data.shape)[mask]
+    return (
+        np.bincount(values, minlength=size),
+        np.bincount(values, weights=weights, minlength=size),
+    )
+
+
+def statistics(key: str, counts: np.ndarray, areas: np.ndarray) -> Dict[str, Any]:
+    """Summarizes the histogram of an asset over a zone.
+
+    Categorical assets get the pixel count and area of each class. Other
+    assets get the count, area, minimum, maximum and mean of their valid
+    values, and the pixel count of each code outside the valid range.
+    """
+    if key not in VALID_RANGES:
+        return {
+            "count": int(counts.sum()),
+            "area_km2": float(areas.sum()),
+            "classes": {
+                str(value): {
+                    "count": int(counts[value]),
+                    "area_km2": float(areas[value]),
+                }
+                for value in np.flatnonzero(counts)
+            },
+        }
+
+    low, high = VALID_RANGES[key]
+    valid = counts[low : high + 1]
+    present = np.flatnonzero(valid)
+    result: Dict[str, Any] = {
+        "count": int(valid.sum()),
+        "area_km2": float(areas[low : high + 1].sum()),
+        "min": None,
+        "max": None,
+        "mean": None,
+    }
+    if present.size:
+        values = np.arange(low, high + 1)
+        result["min"] = int(values[present[0]])
+        result["max"] = int(values[present[-1]])
+        result["mean"] = float((values * valid).sum() / valid.sum())
+    codes = np.flatnonzero(counts)
+    result["codes"] = {
+        str(value): int(counts[value]) for value in codes if not low <= value <= high
+    }
+    return result
+
+
+class QueryEngine:
+    """Computes water statistics for points and polygons from the COGs of
+    indexed items.
+
+    A query resolves the items of each collection whose geometry intersects
+    a zone, then plans the COG blocks covering the zones in each asset.
+    COGs are processed concurrently, one task per COG: blocks not already in
+    the :class:`BlockCache` are read through the
+    :mod:`stactools.jrc_gsw.scheduler`, so remote reads share its
+    concurrency and rate limits, and the area-weighted histograms of the
+    masked pixels of each zone are computed before the task ends, so only
+    the blocks of ``workers`` COGs are held at once besides the cache.
+    Zonal statistics are computed from the histograms, summed across tiles.
+
+    Args:
+        index (ItemIndex): The items to query.
+        cache (BlockCache, optional): The block cache. Default: a new
+            256 MiB cache.
+        workers (int, optional): Number of COGs read at once. Default: 8.
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+    """
+
+    def __init__(
+        self,
+        index: ItemIndex,
+        cache: Optional[BlockCache] = None,
+        workers: int = 8,
+        read_href_modifier: Optional[ReadHrefModifier] = None,
+    ):
+        self.index = index
+        self.cache = cache if cache is not None else BlockCache()
+        self.workers = workers
+        self.read_href_modifier = read_href_modifier
+        self.infos: Dict[str, RasterInfo] = {}
+        self.items: Dict[Tuple[str, Optional[int]], QueryItem] = {}
+        self.lock = threading.Lock()
+
+    def resolve(
+        self,
+        geometry: BaseGeometry,
+        collections: Optional[List[str]] = None,
+        interval: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+    ) -> List[Tuple[str, IndexEntry]]:
+        """Returns the collection IDs and entries of the items whose geometry
+        intersects a zone."""
+        collection_ids = set(collections or QUERY_ASSETS)
+        entries = []
+        after = -1
+        while True:
+            page, next_position = self.index.search(
+                bbox=geometry.bounds,
+                interval=interval,
+                limit=MAX_LIMIT,
+                after=after,
+            )
+            for entry in page:
+                item = self._item(entry)
+                if item.collection_id in collection_ids and item.footprint.intersects(
+                    geometry
+                ):
+                    entries.append((item.collection_id, entry))
+            if next_position is None:
+                return entries
+            after = next_position
+
+    def _item(self, entry: IndexEntry) -> QueryItem:
+        """Returns the fields of an item needed by queries.
+
+        Only the footprint, period and hrefs of the queried assets are kept,
+        not the whole item. Items written without a collection link are
+        assigned to the collection whose assets they have.
+        """
+        key = (entry.path, entry.offset)
+        with self.lock:
+            cached = self.items.get(key)
+        if cached is not None:
+            return cached
+
+        item = self.index.read(entry)
+        assets = item.get("assets", {})
+        collection_id = entry.collection or next(
+            (
+                collection_id
+                for collection_id, keys in QUERY_ASSETS.items()
+                if keys[0] in assets
+            ),
+            "",
+        )
+        geometry = item.get("geometry")
+        properties = item.get("properties", {})
+        query_item = QueryItem(
+            collection_id,
+            shape(geometry) if geometry else box(*entry.bbox),
+            {
+                key: assets[key]["href"]
+                for key in QUERY_ASSETS.get(collection_id, [])
+                if key in assets
+            },
+            properties.get("start_datetime"),
+            properties.get("end_datetime"),
+        )
+        with self.lock:
+            return self.items.setdefault(key, query_item)
+
+    def _info(self, href: str) -> RasterInfo:
+        info = self.infos.get(href)
+        if info is None:
+            info = scheduler.get_scheduler().call(href, read_raster_info, href)
+            self.infos[href] = info
+        return info
+
+    def plan(
+        self,
+        geometries: List[BaseGeometry],
+        entries: Iterable[IndexEntry],
+        pool: ThreadPoolExecutor,
+    ) -> List[Tuple[int, Read]]:
+        """Returns the windows to read for each zone, as (zone, read) pairs."""
+        assets = []
+        for entry in entries:
+            item = self._item(entry)
+            for key, href in item.hrefs.items():
+                if self.read_href_modifier:
+                    href = self.read_href_modifier(href)
+                period = (item.collection_id, key, item.start, item.end)
+                assets.append((period, item.footprint, href))
+
+        # Headers of COGs not queried before are read concurrently.
+        unknown = {href for _, _, href in assets if href not in self.infos}
+        list(pool.map(self._info, unknown))
+
+        reads = []
+        for zone, geometry in enumerate(geometries):
+            for period, footprint, href in assets:
+                if not footprint.intersects(geometry):
+                    continue
+                info = self.infos[href]
+                window = pixel_window(geometry.bounds, info)
+                if window is not None:
+                    blocks = covering_blocks(href, window, info)
+                    reads.append((zone, Read(period, href, info, window, blocks)))
+        return reads
+
+    def fetch(self, href: str, keys: List[BlockKey]) -> Dict[BlockKey, np.ndarray]:
+        """Returns blocks of a COG, reading those not cached."""
+        blocks: Dict[BlockKey, np.ndarray] = {}
+        missing = []
+        for key in keys:
+            block = self.cache.get(key)
+            if block is None:
+                missing.append(key)
+            else:
+                blocks[key] = block
+
+        if missing:
+            result = scheduler.get_scheduler().call(href, read_blocks, href, missing)
+            for key, block in result.items():
+                self.cache.put(key, block)
+                blocks[key] = block
+
+        logger.debug(f"Read {len(missing)} of {len(keys)} blocks from {href}")
+        return blocks
+
+    def measure(
+        self, zones: List[BaseGeometry], reads: List[Tuple[int, Read]]
+    ) -> List[Histogram]:
+        """Returns the histograms of the reads of one COG, as (zone, period,
+        counts, areas) tuples.
+
+        The blocks of the COG are fetched once for all the reads, and are
+        released when the histograms are computed.
+        """
+        keys = list(dict.fromkeys(key for _, read in reads for key in read.blocks))
+        blocks = self.fetch(reads[0][1].href, keys)
+
+        histograms = []
+        for zone, read in reads:
+            data = mosaic(read, blocks)
+            window_transform = windows.transform(read.window, read.info.transform)
+            mask = geometry_mask(
+                [mapping(zones[zone])],
+                data.shape,
+                window_transform,
+                invert=True,
+            )
+            if not mask.any():
+                continue
+            areas = row_areas(
+                read.info.transform, read.window.row_off, read.window.height
+            )
+            counts, class_areas = histogram(data, mask, areas)
+            histograms.append((zone, read.period, counts, class_areas))
+        return histograms
+
+    def query_many(
+        self,
+        geometries: List[Dict[str, Any]],
+        collections: Optional[List[str]] = None,
+        interval: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Computes the water statistics of several zones at once.
+
+        Blocks shared by several zones are read once.
+
+        Args:
+            geometries (List[dict]): GeoJSON geometries, e.g. points or
+                polygons, in EPSG:4326.
+            collections (List[str], optional): IDs of the collections to
+                query. Default: Aggregated, YearlyClassification and
+                MonthlyHistory.
+            interval (tuple, optional): Start and end datetimes of the items
+                to query, either of which may be None.
+
+        Returns:
+            List[dict]: For each zone, the statistics of each asset of each
+            collection, as a list of periods sorted by start datetime.
+        """
+        zones = [shape(geometry) for geometry in geometries]
+        entries: Dict[Tuple[str, Optional[int]], IndexEntry] = {}
+        for zone in zones:
+            for _, entry in self.resolve(zone, collections, interval):
+                entries[(entry.path, entry.offset)] = entry
+
+        totals: List[Dict[Period, Tuple[np.ndarray, np.ndarray]]] = [{} for _ in zones]
+        with ThreadPoolExecutor(self.workers) as pool:
+            reads_by_href: Dict[str, List[Tuple[int, Read]]] = {}
+            for zone, read in self.plan(zones, entries.values(), pool):
+                reads_by_href.setdefault(read.href, []).append((zone, read))
+
+            for histograms in pool.map(
+                partial(self.measure, zones), reads_by_href.values()
+            ):
+                for zone, period, counts, class_areas in histograms:
+                    if period in totals[zone]:
+                        total_counts, total_areas = totals[zone][period]
+                        counts = counts + total_counts
+                        class_areas = class_areas + total_areas
+                    totals[zone][period] = (counts, class_areas)
+
+        results = []
+        for zone_totals in totals:
+            result: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+            for period in sorted(zone_totals, key=lambda p: (p[0], p[1], p[2] or "")):
+                collection_id, key, start, end = period
+                stats = statistics(key, *zone_totals[period])
+                stats = dict({"start_datetime": start, "end_datetime": end}, **stats)
+                result.setdefault(collection_id, {}).setdefault(key, []).append(stats)
+            results.append(result)
+        return results
+
+    def query(
+        self,
+        geometry: Dict[str, Any],
+        collections: Optional[List[str]] = None,
+        interval: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+    ) -> Dict[str, Any]:
+        """Computes the water statistics of a point or polygon, see
+        :meth:`query_many`."""
+        return self.query_many([geometry], collections, interval)[0]
+
+
+def read_geometries(value: str) -> List[Dict[str, Any]]:
+    """Reads the zones of a query from a GeoJSON file or string, or from a
+    ``lon,lat`` pair.
+
+    Returns:
+        List[dict]: The geometry, or the geometries of a Feature or
+        FeatureCollection.
+
+    Raises:
+        ValueError: If the value is not a GeoJSON object or a point.
+    """
+    if os.path.exists(value):
+        with open(value) as f:
+            geojson = json.load(f)
+    else:
+        try:
+            geojson = json.loads(value)
+        except ValueError:
+            try:
+                lon, lat = (float(part) for part in value.split(","))
+            except ValueError:
+                raise ValueError(f"Invalid geometry: {value}")
+            geojson = {"type": "Point", "coordinates": [lon, lat]}
+
+    if not isinstance(geojson, dict):
+        raise ValueError(f"Invalid geometry: {value}")
+    try:
+        if geojson.get("type") == "FeatureCollection":
+            geometries = [feature["geometry"] for feature in geojson["features"]]
+        elif geojson.get("type") == "Feature":
+            geometries = [geojson["geometry"]]
+        else:
+            geometries = [geojson]
+    except (KeyError, TypeError):
+        raise ValueError(f"Invalid feature: {value}")
+    for geometry in geometries:
+        if not isinstance(geometry, dict):
+            raise ValueError(f"Invalid geometry: {geometry}")
+    return geometries
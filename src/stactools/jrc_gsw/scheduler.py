@@ -0,0 +1,213 @@
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP statuses that mean the server is overloaded or throttling us, and that
+# the request may be retried.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# GDAL reports HTTP errors from /vsicurl/ only in the error message.
+GDAL_STATUS_PATTERN = re.compile(r"HTTP response code: (\d{3})")
+
+
+def error_status(error: Optional[BaseException]) -> Optional[int]:
+    """Returns the HTTP status of a failed fsspec or rasterio read, if any.
+
+    fsspec wraps some HTTP errors, e.g. in ``FileNotFoundError``, so the
+    causes of ``error`` are searched too.
+    """
+    while error is not None:
+        status = getattr(error, "status", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        if status is None:
+            match = GDAL_STATUS_PATTERN.search(str(error))
+            if match:
+                status = int(match.group(1))
+        if isinstance(status, int):
+            return status
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return error_status(error) in RETRYABLE_STATUSES
+
+
+class TokenBucket:
+    """Limits the rate of requests to ``rate`` per second, allowing bursts of
+    up to ``capacity`` requests."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """Limits the number of requests in flight, adapting the limit with
+    additive increase and multiplicative decrease (AIMD).
+
+    The limit grows by about one for every ``limit`` successful requests and
+    is multiplied by ``decrease`` whenever a request is throttled.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        initial_limit: Optional[int] = None,
+        decrease: float = 0.5,
+    ):
+        self.max_limit = max_limit
+        self.limit = float(initial_limit or min(4, max_limit))
+        self.decrease = decrease
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self) -> None:
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit * self.decrease)
+                logger.debug(f"Throttled, concurrency limit now {int(self.limit)}")
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class IOScheduler:
+    """Schedules remote reads, per host, with an adaptive concurrency limit,
+    an optional token bucket rate limit and retries with jittered
+    exponential backoff.
+
+    Reads of local files are run directly.
+
+    Args:
+        max_concurrency (int, optional): Upper bound of the adaptive
+            concurrency limit, per host. Default: 16.
+        rate_limit (float, optional): Maximum requests per second, per host.
+            Unlimited by default.
+        max_retries (int, optional): Retries of throttled or failed requests.
+            Default: 5.
+        backoff (float, optional): Base backoff, in seconds. Retry ``n`` waits
+            a random time of up to ``backoff * 2 ** n`` seconds. Default: 0.5.
+        max_backoff (float, optional): Maximum backoff, in seconds.
+            Default: 30.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        rate_limit: Optional[float] = None,
+        max_retries: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiters: Dict[str, AdaptiveLimiter] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rate_limit": self.rate_limit,
+            "max_retries": self.max_retries,
+            "backoff": self.backoff,
+            "max_backoff": self.max_backoff,
+        }
+
+    def _host_state(self, host: str) -> AdaptiveLimiter:
+        with self.lock:
+            if host not in self.limiters:
+                self.limiters[host] = AdaptiveLimiter(self.max_concurrency)
+                if self.rate_limit:
+                    self.buckets[host] = TokenBucket(self.rate_limit)
+            return self.limiters[host]
+
+    def call(self, href: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Calls ``fn(*args, **kwargs)``, which reads ``href``."""
+        url = urlsplit(href)
+        if url.scheme in ("", "file") or not url.netloc:
+            return fn(*args, **kwargs)
+
+        limiter = self._host_state(url.netloc)
+        bucket = self.buckets.get(url.netloc)
+
+        attempt = 0
+        while True:
+            if bucket is not None:
+                bucket.acquire()
+            limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                retryable = is_retryable(e)
+                limiter.release(throttled=retryable)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = random.uniform(
+                    0, min(self.max_backoff, self.backoff * 2**attempt)
+                )
+                logger.info(
+                    f"Retrying {href} in {delay:.2f}s after {type(e).__name__}: {e}"
+                )
+                time.sleep(delay)
+                attempt += 1
+                continue
+            limiter.release()
+            return result
+
+
+_scheduler = IOScheduler()
+
+
+def get_scheduler() -> IOScheduler:
+    """Returns the scheduler used for remote reads in this process."""
+    return _scheduler
+
+
+def configure(**options: Any) -> IOScheduler:
+    """Replaces the scheduler used for remote reads in this process, unless
+    it already has the given options. See :class:`IOScheduler`."""
+    global _scheduler
+    if dict(_scheduler.options, **options) != _scheduler.options:
+        _scheduler = IOScheduler(**dict(_scheduler.options, **options))
+    return _scheduler
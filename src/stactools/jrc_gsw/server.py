@@ -0,0 +1,719 @@
+import asyncio
+import base64
+import json
+import logging
+import math
+import os.path
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from pystac.utils import str_to_datetime
+
+from stactools.jrc_gsw.collections import (
+    AGGREGATED,
+    MONTHLY_HISTORY,
+    MONTHLY_RECURRENCE,
+    YEARLY_CLASSIFICATION,
+)
+
+logger = logging.getLogger(__name__)
+
+CONFORMANCE = [
+    "https://api.stacspec.org/v1.0.0/core",
+    "https://api.stacspec.org/v1.0.0/collections",
+    "https://api.stacspec.org/v1.0.0/ogcapi-features",
+    "https://api.stacspec.org/v1.0.0/item-search",
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/core",
+    "http://www.opengis.net/spec/ogcapi-features-1/1.0/conf/geojson",
+]
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 10000
+
+# IDs of the collections that create-items writes one directory for.
+COLLECTION_IDS = {
+    collection["ID"]
+    for collection in [
+        AGGREGATED,
+        MONTHLY_HISTORY,
+        MONTHLY_RECURRENCE,
+        YEARLY_CLASSIFICATION,
+    ]
+}
+
+# Size, in degrees, of the cells of the spatial index.
+GRID_CELL_SIZE = 1.0
+
+# Size, in bytes, of the COG block cache of /query.
+DEFAULT_BLOCK_CACHE_SIZE = 256 * 2**20
+
+STATUS_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    500: "Internal Server Error",
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+class NotFound(Exception):
+    pass
+
+
+class IndexEntry(NamedTuple):
+    """The searchable fields of an item and where to read the item from."""
+
+    start: datetime
+    end: datetime
+    collection: Optional[str]
+    id: str
+    bbox: Tuple[float, float, float, float]
+    path: str
+    offset: Optional[int]
+
+
+class ItemIndex:
+    """A compact, read-only index of items written by ``create-items`` or
+    stored as newline-delimited JSON.
+
+    Only the searchable fields of each item are kept in memory. Entries are
+    sorted by start datetime, so datetime filters are a binary search and
+    page cursors are entry positions; bboxes are resolved through a grid of
+    :data:`GRID_CELL_SIZE` degree cells. Items are read from disk when they
+    are returned.
+    """
+
+    def __init__(self) -> None:
+        self.entries: List[IndexEntry] = []
+        self.starts: List[datetime] = []
+        self.collections: Dict[str, Dict[str, Any]] = {}
+        self.grid: Dict[Tuple[int, int], List[int]] = {}
+        self.positions: Dict[Tuple[Optional[str], str], int] = {}
+
+    @classmethod
+    def from_paths(cls, paths: Iterable[str]) -> "ItemIndex":
+        """Builds an index from directories of STAC JSON files and from
+        ``.ndjson`` files with one item per line.
+        """
+        index = cls()
+        entries = []
+        for path in paths:
+            if os.path.isdir(path):
+                for dirpath, _, filenames in os.walk(path):
+                    for filename in sorted(filenames):
+                        if filename.endswith(".json"):
+                            entries.extend(
+                                index._load_json(os.path.join(dirpath, filename))
+                            )
+            elif path.endswith(".ndjson"):
+                entries.extend(index._load_ndjson(path))
+            else:
+                entries.extend(index._load_json(path))
+
+        index._build(entries)
+        logger.info(f"Indexed {len(index.entries)} items")
+        return index
+
+    def _load_json(self, path: str) -> List[IndexEntry]:
+        with open(path) as f:
+            stac_object = json.load(f)
+        if stac_object.get("type") == "Collection":
+            self.collections[stac_object["id"]] = stac_object
+            return []
+        if stac_object.get("type") == "Feature":
+            return [self._entry(stac_object, os.path.abspath(path), None)]
+        return []
+
+    def _load_ndjson(self, path: str) -> List[IndexEntry]:
+        entries = []
+        with open(path, "rb") as f:
+            offset = f.tell()
+            line = f.readline()
+            while line:
+                if line.strip():
+                    item = json.loads(line)
+                    entries.append(self._entry(item, os.path.abspath(path), offset))
+                offset = f.tell()
+                line = f.readline()
+        return entries
+
+    @staticmethod
+    def _entry(item: Dict[str, Any], path: str, offset: Optional[int]) -> IndexEntry:
+        """Returns the index entry of an item.
+
+        Items written by ``create-items`` without ``--collections`` have no
+        ``collection`` field; JSON files among them are assigned to the
+        collection named by their directory, ``<destination>/<collection id>``.
+        """
+        properties = item["properties"]
+        collection = item.get("collection")
+        if collection is None and offset is None:
+            directory = os.path.basename(os.path.dirname(path))
+            if directory in COLLECTION_IDS:
+                collection = directory
+        start = properties.get("start_datetime") or properties["datetime"]
+        end = properties.get("end_datetime") or properties["datetime"]
+        return IndexEntry(
+            str_to_datetime(start),
+            str_to_datetime(end),
+            collection,
+            item["id"],
+            tuple(item["bbox"][:4]),
+            path,
+            offset,
+        )
+
+    def _build(self, entries: List[IndexEntry]) -> None:
+        self.entries = sorted(
+            entries, key=lambda e: (e.start, e.collection or "", e.id)
+        )
+        self.starts = [entry.start for entry in self.entries]
+        for position, entry in enumerate(self.entries):
+            self.positions[(entry.collection, entry.id)] = position
+            for cell in _cells(entry.bbox):
+                self.grid.setdefault(cell, []).append(position)
+
+    def search(
+        self,
+        bbox: Optional[Tuple[float, float, float, float]] = None,
+        interval: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None,
+        collections: Optional[List[str]] = None,
+        ids: Optional[List[str]] = None,
+        limit: int = DEFAULT_LIMIT,
+        after: int = -1,
+        intersects: Optional[Any] = None,
+    ) -> Tuple[List[IndexEntry], Optional[int]]:
+        """Returns a page of matching entries, and the position to continue
+        from if there are more.
+
+        ``intersects`` is a shapely geometry. Its candidates are found through
+        the grid and bboxes, then the geometries of their items are read and
+        tested exactly.
+        """
+        stop = len(self.entries)
+        if interval is not None and interval[1] is not None:
+            stop = bisect_right(self.starts, interval[1])
+        bounds = bbox
+        if intersects is not None:
+            from shapely.geometry import box, shape
+
+            bounds = tuple(intersects.bounds)
+
+        if bounds is not None:
+            candidates: Iterable[int] = sorted(
+                {p for cell in _cells(bounds) for p in self.grid.get(cell, [])}
+            )
+        else:
+            candidates = range(after + 1, stop)
+
+        collection_set = set(collections) if collections else None
+        id_set = set(ids) if ids else None
+
+        page: List[IndexEntry] = []
+        last_position = after
+        for position in candidates:
+            if position <= after:
+                continue
+            if position >= stop:
+                break
+            entry = self.entries[position]
+            if interval is not None and interval[0] is not None:
+                if entry.end < interval[0]:
+                    continue
+            if collection_set is not None and entry.collection not in collection_set:
+                continue
+            if id_set is not None and entry.id not in id_set:
+                continue
+            if bbox is not None and not _intersects(entry.bbox, bbox):
+                continue
+            if intersects is not None:
+                if not _intersects(entry.bbox, bounds):
+                    continue
+                geometry = self.read(entry).get("geometry")
+                footprint = shape(geometry) if geometry else box(*entry.bbox)
+                if not footprint.intersects(intersects):
+                    continue
+            if len(page) == limit:
+                return page, last_position
+            page.append(entry)
+            last_position = position
+
+        return page, None
+
+    def get(self, collection: Optional[str], item_id: str) -> IndexEntry:
+        try:
+            return self.entries[self.positions[(collection, item_id)]]
+        except KeyError:
+            raise NotFound(f"Item {item_id} not found in collection {collection}")
+
+    @staticmethod
+    def read(entry: IndexEntry) -> Dict[str, Any]:
+        """Reads an item, making relative asset hrefs absolute."""
+        with open(entry.path, "rb") as f:
+            if entry.offset is None:
+                item = json.load(f)
+            else:
+                f.seek(entry.offset)
+                item = json.loads(f.readline())
+
+        item_dir = os.path.dirname(entry.path)
+        for asset in item.get("assets", {}).values():
+            href = asset["href"]
+            if "://" not in href and not os.path.isabs(href):
+                asset["href"] = os.path.normpath(os.path.join(item_dir, href))
+        return item
+
+
+def _cells(bbox: Tuple[float, ...]) -> Set[Tuple[int, int]]:
+    xmin = math.floor(bbox[0] / GRID_CELL_SIZE)
+    ymin = math.floor(bbox[1] / GRID_CELL_SIZE)
+    xmax = math.floor(bbox[2] / GRID_CELL_SIZE)
+    ymax = math.floor(bbox[3] / GRID_CELL_SIZE)
+    return {(x, y) for x in range(xmin, xmax + 1) for y in range(ymin, ymax + 1)}
+
+
+def _intersects(a: Tuple[float, ...], b: Tuple[float, ...]) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def parse_bbox(value: Any) -> Tuple[float, float, float, float]:
+    if isinstance(value, str):
+        value = value.split(",")
+    try:
+        bbox = [float(v) for v in value]
+    except (TypeError, ValueError):
+        raise BadRequest(f"Invalid bbox: {value}")
+    if len(bbox) == 6:
+        bbox = [bbox[0], bbox[1], bbox[3], bbox[4]]
+    if len(bbox) != 4:
+        raise BadRequest(f"Invalid bbox: {value}")
+    return bbox[0], bbox[1], bbox[2], bbox[3]
+
+
+def parse_datetime(value: str) -> Tuple[Optional[datetime], Optional[datetime]]:
+    parts = value.split("/")
+    if len(parts) > 2:
+        raise BadRequest(f"Invalid datetime: {value}")
+    try:
+        bounds = [
+            None if part in ("", "..") else str_to_datetime(part) for part in parts
+        ]
+    except ValueError:
+        raise BadRequest(f"Invalid datetime: {value}")
+    if len(bounds) == 1:
+        return bounds[0], bounds[0]
+    return bounds[0], bounds[1]
+
+
+def parse_geometry(value: Any, name: str = "geometry") -> Any:
+    """Returns the shapely geometry of a GeoJSON geometry, given as a
+    dictionary or a JSON string."""
+    # Imported here so that serving items without geometries does not need
+    # shapely.
+    from shapely.errors import ShapelyError
+    from shapely.geometry import shape
+
+    try:
+        if isinstance(value, str):
+            value = json.loads(value)
+        return shape(value)
+    except (AttributeError, KeyError, ShapelyError, TypeError, ValueError) as e:
+        raise BadRequest(f"Invalid {name}: {e}")
+
+
+def encode_token(position: int) -> str:
+    return base64.urlsafe_b64encode(str(position).encode()).decode()
+
+
+def decode_token(token: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(token.encode()).decode())
+    except ValueError:
+        raise BadRequest(f"Invalid token: {token}")
+
+
+class StacApiServer:
+    """A read-only STAC API serving an :class:`ItemIndex` over HTTP.
+
+    Supports the landing page, ``/conformance``, ``/collections``,
+    ``/collections/{id}/items``, ``/collections/{id}/items/{item id}`` and
+    ``/search`` with GET and POST, filtered by ``bbox``, ``datetime``,
+    ``collections`` and ``ids`` and paged with a ``token`` cursor. Water
+    statistics of points and polygons are served by POST ``/query``, see
+    :class:`stactools.jrc_gsw.query.QueryEngine`. Responses are kept in an
+    LRU cache of ``cache_size`` entries.
+
+    Args:
+        index (ItemIndex): The items to serve.
+        host (str, optional): Default: "127.0.0.1".
+        port (int, optional): Default: 8080. Use 0 for any free port.
+        cache_size (int, optional): Number of responses cached. Default: 1024.
+        block_cache_size (int, optional): Size, in bytes, of the COG blocks
+            cached for ``/query``. Default: 256 MiB.
+    """
+
+    def __init__(
+        self,
+        index: ItemIndex,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        cache_size: int = 1024,
+        block_cache_size: int = DEFAULT_BLOCK_CACHE_SIZE,
+    ):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.cache_size = cache_size
+        self.block_cache_size = block_cache_size
+        self.query_engine: Optional[Any] = None
+        self.cache: "OrderedDict[Tuple[str, str, str], Tuple[int, bytes]]" = (
+            OrderedDict()
+        )
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> None:
+        self.server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Serving STAC API at {self.url}")
+
+    async def serve_forever(self) -> None:
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                body = b""
+                if "content-length" in headers:
+                    body = await reader.readexactly(int(headers["content-length"]))
+
+                status, payload = await self.respond(method, target, body)
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {STATUS_REASONS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(payload)}\r\n"
+                        "\r\n"
+                    ).encode("latin-1")
+                    + payload
+                )
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, method: str, target: str, body: bytes) -> Tuple[int, bytes]:
+        """Returns the status and JSON body of the response to a request."""
+        key = (method, target, body.decode("utf-8"))
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        loop = asyncio.get_event_loop()
+        try:
+            result = await loop.run_in_executor(None, self.route, method, target, body)
+            response = (200, json.dumps(result).encode("utf-8"))
+        except BadRequest as e:
+            response = (
+                400,
+                json.dumps({"code": "BadRequest", "description": str(e)}).encode(
+                    "utf-8"
+                ),
+            )
+        except NotFound as e:
+            response = (
+                404,
+                json.dumps({"code": "NotFound", "description": str(e)}).encode("utf-8"),
+            )
+        except Exception as e:
+            logger.exception(f"Error handling {method} {target}")
+            response = (
+                500,
+                json.dumps({"code": "ServerError", "description": str(e)}).encode(
+                    "utf-8"
+                ),
+            )
+
+        if response[0] == 200:
+            self.cache[key] = response
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return response
+
+    def route(self, method: str, target: str, body: bytes) -> Dict[str, Any]:
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if method == "POST" and parts == ["search"]:
+            try:
+                params = json.loads(body or b"{}")
+            except ValueError:
+                raise BadRequest("Invalid JSON body")
+            return self.search(params, method="POST")
+        if method == "POST" and parts == ["query"]:
+            try:
+                params = json.loads(body or b"{}")
+            except ValueError:
+                raise BadRequest("Invalid JSON body")
+            return self.query(params)
+        if method != "GET":
+            raise BadRequest(f"Method {method} not allowed for {url.path}")
+
+        if not parts:
+            return self.landing_page()
+        if parts == ["conformance"]:
+            return {"conformsTo": CONFORMANCE}
+        if parts == ["search"]:
+            return self.search(_query_params(query))
+        if parts[0] == "collections":
+            if len(parts) == 1:
+                return {
+                    "collections": [
+                        self.collection(c) for c in sorted(self.index.collections)
+                    ],
+                    "links": [self._link("self", "/collections")],
+                }
+            if len(parts) == 2:
+                return self.collection(parts[1])
+            if len(parts) == 3 and parts[2] == "items":
+                params = _query_params(query)
+                params["collections"] = [parts[1]]
+                return self.search(params, path=f"/collections/{parts[1]}/items")
+            if len(parts) == 4 and parts[2] == "items":
+                return self.item(self.index.get(parts[1], parts[3]))
+
+        raise NotFound(f"Not found: {url.path}")
+
+    def landing_page(self) -> Dict[str, Any]:
+        return {
+            "type": "Catalog",
+            "stac_version": "1.0.0",
+            "id": "jrc-gsw",
+            "description": "European Commission Joint Research Centre - Global Surface Water",  # noqa
+            "conformsTo": CONFORMANCE,
+            "links": [
+                self._link("self", "/"),
+                self._link("root", "/"),
+                self._link("conformance", "/conformance"),
+                self._link("data", "/collections"),
+                self._link("search", "/search", "application/geo+json", "GET"),
+                self._link("search", "/search", "application/geo+json", "POST"),
+                self._link("query", "/query", "application/json", "POST"),
+            ],
+        }
+
+    def collection(self, collection_id: str) -> Dict[str, Any]:
+        if collection_id not in self.index.collections:
+            raise NotFound(f"Collection {collection_id} not found")
+        collection = dict(self.index.collections[collection_id])
+        collection["links"] = [
+            self._link("self", f"/collections/{collection_id}"),
+            self._link("root", "/"),
+            self._link("parent", "/"),
+            self._link(
+                "items",
+                f"/collections/{collection_id}/items",
+                "application/geo+json",
+            ),
+        ]
+        return collection
+
+    def item(self, entry: IndexEntry) -> Dict[str, Any]:
+        item = self.index.read(entry)
+        if entry.collection:
+            item.setdefault("collection", entry.collection)
+        path = f"/collections/{entry.collection}/items/{entry.id}"
+        item["links"] = [
+            link
+            for link in item.get("links", [])
+            if link["rel"] not in ("self", "root", "parent", "collection")
+        ] + [
+            self._link("self", path, "application/geo+json"),
+            self._link("root", "/"),
+        ]
+        if entry.collection:
+            item["links"].extend(
+                [
+                    self._link("parent", f"/collections/{entry.collection}"),
+                    self._link("collection", f"/collections/{entry.collection}"),
+                ]
+            )
+        return item
+
+    def search(
+        self, params: Dict[str, Any], method: str = "GET", path: str = "/search"
+    ) -> Dict[str, Any]:
+        try:
+            limit = int(params.get("limit", DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            raise BadRequest(f"Invalid limit: {params['limit']}")
+        if not 0 < limit <= MAX_LIMIT:
+            raise BadRequest(f"limit must be between 1 and {MAX_LIMIT}")
+        if params.get("bbox") and params.get("intersects"):
+            raise BadRequest("Only one of bbox and intersects can be given")
+
+        entries, next_position = self.index.search(
+            bbox=parse_bbox(params["bbox"]) if params.get("bbox") else None,
+            interval=(
+                parse_datetime(params["datetime"]) if params.get("datetime") else None
+            ),
+            collections=params.get("collections"),
+            ids=params.get("ids"),
+            limit=limit,
+            after=decode_token(params["token"]) if params.get("token") else -1,
+            intersects=(
+                parse_geometry(params["intersects"], "intersects")
+                if params.get("intersects")
+                else None
+            ),
+        )
+
+        links = [self._link("root", "/")]
+        if next_position is not None:
+            token = encode_token(next_position)
+            if method == "POST":
+                next_link = self._link("next", path, "application/geo+json", "POST")
+                next_link["body"] = dict(params, token=token)
+            else:
+                query_params = dict(params, token=token)
+                if path != "/search":
+                    query_params.pop("collections", None)
+                query = _encode_query(query_params)
+                next_link = self._link(
+                    "next", f"{path}?{query}", "application/geo+json"
+                )
+            links.append(next_link)
+
+        return {
+            "type": "FeatureCollection",
+            "features": [self.item(entry) for entry in entries],
+            "links": links,
+            "numberReturned": len(entries),
+        }
+
+    def query(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Computes the water statistics of the ``geometry``, or of each of
+        the ``geometries``, of a request, filtered by ``datetime`` and
+        ``collections``."""
+        # Imported here so that serving items does not need rasterio.
+        from stactools.jrc_gsw.query import BlockCache, QueryEngine
+
+        if "geometries" in params:
+            geometries = params["geometries"]
+            if not isinstance(geometries, list):
+                raise BadRequest("geometries must be a list")
+        elif "geometry" in params:
+            geometries = [params["geometry"]]
+        else:
+            raise BadRequest("geometry or geometries is required")
+        for geometry in geometries:
+            if not isinstance(geometry, dict):
+                raise BadRequest(f"Invalid geometry: {geometry}")
+            parse_geometry(geometry)
+        interval = (
+            parse_datetime(params["datetime"]) if params.get("datetime") else None
+        )
+
+        if self.query_engine is None:
+            self.query_engine = QueryEngine(
+                self.index, BlockCache(self.block_cache_size)
+            )
+        results = self.query_engine.query_many(
+            geometries, params.get("collections"), interval
+        )
+
+        if "geometries" in params:
+            return {"results": results}
+        return results[0]
+
+    def _link(
+        self,
+        rel: str,
+        path: str,
+        media_type: str = "application/json",
+        method: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        link = {"rel": rel, "href": f"{self.url}{path}", "type": media_type}
+        if method is not None:
+            link["method"] = method
+        return link
+
+
+def _query_params(query: Dict[str, str]) -> Dict[str, Any]:
+    params: Dict[str, Any] = dict(query)
+    for key in ("collections", "ids"):
+        if key in params:
+            params[key] = params[key].split(",")
+    return params
+
+
+def _encode_query(params: Dict[str, Any]) -> str:
+    return urlencode(
+        {
+            k: ",".join(str(x) for x in v) if isinstance(v, (list, tuple)) else v
+            for k, v in params.items()
+        }
+    )
+
+
+def serve(
+    paths: Iterable[str],
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    cache_size: int = 1024,
+    block_cache_size: int = DEFAULT_BLOCK_CACHE_SIZE,
+) -> None:
+    """Indexes items and serves them until interrupted.
+
+    Args:
+        paths (Iterable[str]): Directories written by ``create-items`` and
+            ``.ndjson`` item files.
+        host (str, optional): Default: "127.0.0.1".
+        port (int, optional): Default: 8080.
+        cache_size (int, optional): Number of responses cached. Default: 1024.
+        block_cache_size (int, optional): Size, in bytes, of the COG blocks
+            cached for ``/query``. Default: 256 MiB.
+    """
+    server = StacApiServer(
+        ItemIndex.from_paths(paths), host, port, cache_size, block_cache_size
+    )
+    asyncio.run(server.serve_forever())
@@ -1,14 +1,12 @@
-import fsspec
+import copy
 import logging
 import os.path
 
 from dateutil.relativedelta import relativedelta
-from typing import Optional
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
 from urllib.parse import urlparse
 
-import rasterio as rio
-from shapely.geometry import box, mapping, shape
-
 import pystac
 from pystac.asset import Asset
 from pystac.extensions.file import FileExtension
@@ -19,11 +17,11 @@ from pystac.extensions.raster import RasterBand, RasterExtension
 from pystac.extensions.version import ItemVersionExtension
 from pystac.utils import str_to_datetime, datetime_to_str
 
-from stactools.core.io import ReadHrefModifier
-from stactools.core.projection import reproject_geom
+from stactools.jrc_gsw import scheduler
 from stactools.jrc_gsw.assets import (
     ITEM_ASSETS,
     CHANGE_KEY,
+    CLASS_AREAS_KEY,
     EXTENT_KEY,
     OCCURRENCE_KEY,
     RECURRENCE_KEY,
@@ -44,13 +42,18 @@ from stactools.jrc_gsw.collections import (
 from stactools.jrc_gsw.constants import (
     CITATION,
     DOI,
+    DOWNLOADED_VERSIONS,
     END_TIME,
     EPSG,
     JRC_GSW_PROVIDER,
+    LATEST_DATA_VERSION,
     LICENSE,
     START_TIME,
 )
 
+if TYPE_CHECKING:
+    from stactools.core.io import ReadHrefModifier
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,19 +61,71 @@ class UnexpectedPathError(Exception):
     pass
 
 
-def collect_raster_stats(
-    href: str, read_href_modifier: Optional[ReadHrefModifier]
-) -> dict:
-    raster_stats = {}
+@lru_cache(maxsize=None)
+def use_fsspec() -> None:
+    """Reads and writes STAC objects through fsspec, once per process.
 
-    if read_href_modifier:
-        href = read_href_modifier(href)
+    Importing stactools.core loads rasterio, shapely, fsspec and numpy, so it
+    is done by the functions that read rather than on import.
+    """
+    import stactools.core
+
+    stactools.core.use_fsspec()
+
+
+@lru_cache(maxsize=1024)
+def _tile_footprint(crs: str, bounds: Tuple[float, ...]) -> dict:
+    """Reprojects a tile's bounds to a WGS84 footprint.
+
+    Every asset of a tile, in every period, shares the same bounds, so the
+    reprojection is cached per worker process.
+    """
+    from shapely.geometry import box, mapping
+    from stactools.core.projection import reproject_geom
+
+    return reproject_geom(crs, "epsg:4326", mapping(box(*bounds)), precision=6)
+
+
+def get_file_info(href: str) -> dict:
+    """Returns the size and, where the filesystem reports one, the etag of a
+    file, without opening it as a raster."""
+    import fsspec
+
+    fs, path = fsspec.core.url_to_fs(href)
+    info = fs.info(path)
+    return {
+        "size": info.get("size"),
+        "etag": info.get("ETag", info.get("etag")),
+    }
+
+
+def remote_read_options(href: str) -> dict:
+    """GDAL options for reading a COG over HTTP.
+
+    GDAL caches failed requests, e.g. a throttled one, for the life of the
+    process, so the file is not cached once it is closed and a retry sends a
+    fresh request. Directory listings are not needed to read a COG.
+    """
+    if not href.startswith(("http://", "https://")):
+        return {}
+    return {
+        "CPL_VSIL_CURL_NON_CACHED": f"/vsicurl/{href}",
+        "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    }
+
+
+def read_raster_metadata(href: str) -> dict:
+    import rasterio as rio
+    from shapely.geometry import shape
 
-    with rio.open(href) as ds:
+    use_fsspec()
+    raster_stats = {}
+
+    with rio.Env(**remote_read_options(href)), rio.open(href) as ds:
         raster_stats["shape"] = list(ds.shape)
         raster_stats["transform"] = list(ds.transform)
-        raster_stats["geometry"] = reproject_geom(
-            ds.crs, "epsg:4326", mapping(box(*ds.bounds)), precision=6
+        raster_stats["geometry"] = copy.deepcopy(
+            _tile_footprint(ds.crs.to_string(), tuple(ds.bounds))
         )
         raster_stats["proj_bbox"] = list(shape(raster_stats["geometry"]).bounds)
         raster_stats["orig_bbox"] = list(ds.bounds)
@@ -85,10 +140,49 @@ def collect_raster_stats(
             )
         raster_stats["bands"] = raster_bands
 
-    with fsspec.open(href) as file:
-        size = file.size
-        if size is not None:
-            raster_stats["size"] = size
+    return raster_stats
+
+
+def collect_raster_stats(
+    href: str,
+    read_href_modifier: Optional["ReadHrefModifier"],
+    raster_stats_cache: Optional[Dict[tuple, dict]] = None,
+    cache_key: Optional[str] = None,
+    copy_cached: bool = True,
+) -> dict:
+    """Collects the metadata of a COG needed for its asset and item.
+
+    If ``raster_stats_cache`` is given, the raster metadata is looked up by
+    ``cache_key`` (the href by default) and the file's size and etag, and the
+    COG is only opened on a miss. Cached metadata is deep copied, unless
+    ``copy_cached`` is false and the caller does not modify its values.
+
+    Remote reads go through the process's
+    :class:`~stactools.jrc_gsw.scheduler.IOScheduler`, which limits their
+    concurrency and rate and retries them when they are throttled.
+    """
+    if read_href_modifier:
+        href = read_href_modifier(href)
+
+    io_scheduler = scheduler.get_scheduler()
+    file_info = io_scheduler.call(href, get_file_info, href)
+
+    if raster_stats_cache is None:
+        raster_stats = io_scheduler.call(href, read_raster_metadata, href)
+    else:
+        key = (cache_key or href, file_info["size"], file_info["etag"])
+        if key not in raster_stats_cache:
+            raster_stats_cache[key] = io_scheduler.call(
+                href, read_raster_metadata, href
+            )
+        raster_stats = raster_stats_cache[key]
+        if copy_cached:
+            raster_stats = copy.deepcopy(raster_stats)
+        else:
+            raster_stats = dict(raster_stats)
+
+    if file_info["size"] is not None:
+        raster_stats["size"] = file_info["size"]
 
     return raster_stats
 
@@ -97,19 +191,27 @@ def assemble_asset(
     asset_defn: AssetDefinition,
     href: str,
     destination: Optional[str],
-    read_href_modifier: Optional[ReadHrefModifier],
+    read_href_modifier: Optional["ReadHrefModifier"],
+    raster_stats_cache: Optional[Dict[tuple, dict]] = None,
+    cache_key: Optional[str] = None,
 ) -> dict:
-    raster_stats = collect_raster_stats(href, read_href_modifier)
-
-    if not uri_validator(href):
-        href = os.path.relpath(href, destination)
+    raster_stats = collect_raster_stats(
+        href, read_href_modifier, raster_stats_cache, cache_key
+    )
 
     return {
-        "asset_defn": asset_defn.create_asset(href),
+        "asset_defn": asset_defn.create_asset(asset_href(href, destination)),
         "raster_stats": raster_stats,
     }
 
 
+def asset_href(href: str, destination: Optional[str]) -> str:
+    """Makes a local COG href relative to ``destination``."""
+    if uri_validator(href):
+        return href
+    return os.path.relpath(href, destination)
+
+
 def uri_validator(x: str) -> bool:
     try:
         result = urlparse(x)
@@ -118,52 +220,46 @@ def uri_validator(x: str) -> bool:
         return False
 
 
-def create_item(
-    source: str,
-    destination: Optional[str] = None,
-    downloaded_version: Optional[str] = "LATEST",
-    data_version: Optional[str] = "VER4-0",
-    read_href_modifier: Optional[ReadHrefModifier] = None,
-) -> pystac.Item:
-    """Creates a STAC item for a JRC-GSW dataset.
+class ItemLayout(NamedTuple):
+    """Where an item's COGs are, and the fields derived from their paths."""
+
+    collection_id: str
+    item_id: str
+    properties: Dict[str, str]
+    hrefs: List[Tuple[str, str]]
+
+
+def item_layout(source: str, downloaded_version: str = "LATEST") -> ItemLayout:
+    """Works out an item's ID, datetimes and COG hrefs from the path of one of
+    its COGs.
 
     Args:
         source (str): path to COG
-        destination (str, optional): local STAC directory to which
-            asset paths will be made relative
-        downloaded_version (str, optional): child directory within collection directory,
-            indicating the data version. Default: "LATEST".
-            Currently, should be one of: LATEST|VER1-0|VER2-0|VER3-0|VER4-0
-        data_version (str, optional): Version of the data. Default: "VER4-0".
-            Currently, should be one of: VER1-0|VER2-0|VER3-0|VER4-0|
-        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+        downloaded_version (str, optional): child directory within collection
+            directory, indicating the data version. Default: "LATEST".
 
     Returns:
-        pystac.Item: STAC Item object.
+        ItemLayout: The collection ID, item ID, datetime properties and
+        (asset key, href) pairs of the item.
     """
-
     collection_name = os.path.basename(
         os.path.dirname(source.split(downloaded_version)[0])
     )
 
     item_id = os.path.splitext("-".join(os.path.basename(source).split("-")[-2:]))[0]
 
-    assets = {}
-
     if collection_name == "Aggregated":
         root_path = os.path.dirname(source.split(collection_name)[0]) or ""
 
-        agg_types = [
+        agg_hrefs = {}
+        for agg_type in [
             "change",
             "extent",
             "occurrence",
             "recurrence",
             "seasonality",
             "transitions",
-        ]
-
-        agg_hrefs = {}
-        for agg_type in agg_types:
+        ]:
             agg_hrefs[agg_type] = os.path.join(
                 root_path,
                 "Aggregated",
@@ -173,27 +269,17 @@ def create_item(
                 f"{agg_type}-{item_id}.tif",
             )
 
+        collection_id = AGGREGATED["ID"]
         start_datetime = START_TIME
         end_datetime = END_TIME
-        properties = {
-            "start_datetime": datetime_to_str(start_datetime),
-            "end_datetime": datetime_to_str(end_datetime),
-        }
-
-        for key, href in [
+        hrefs = [
             (SEASONALITY_KEY, agg_hrefs["seasonality"]),
             (OCCURRENCE_KEY, agg_hrefs["occurrence"]),
             (CHANGE_KEY, agg_hrefs["change"]),
             (RECURRENCE_KEY, agg_hrefs["recurrence"]),
             (TRANSITIONS_KEY, agg_hrefs["transitions"]),
             (EXTENT_KEY, agg_hrefs["extent"]),
-        ]:
-            assets[key] = assemble_asset(
-                ITEM_ASSETS[AGGREGATED["ID"]][key],
-                href,
-                destination,
-                read_href_modifier,
-            )
+        ]
 
     elif collection_name == "MonthlyHistory":
         year_month = os.path.basename(source).split("-")[0].split("_")
@@ -202,19 +288,10 @@ def create_item(
 
         item_id += f"_{year}_{month}"
 
+        collection_id = MONTHLY_HISTORY["ID"]
         start_datetime = str_to_datetime(f"{year}-{month}-01T00:00:00Z")
         end_datetime = start_datetime + relativedelta(months=1)
-        properties = {
-            "start_datetime": datetime_to_str(start_datetime),
-            "end_datetime": datetime_to_str(end_datetime),
-        }
-
-        assets[MONTHLY_HISTORY_KEY] = assemble_asset(
-            ITEM_ASSETS[MONTHLY_HISTORY["ID"]][MONTHLY_HISTORY_KEY],
-            source,
-            destination,
-            read_href_modifier,
-        )
+        hrefs = [(MONTHLY_HISTORY_KEY, source)]
 
     elif collection_name == "MonthlyRecurrence":
         if "monthlyRecurrence" in source:
@@ -228,42 +305,75 @@ def create_item(
 
         item_id += f"_{str(month).zfill(2)}"
 
+        collection_id = MONTHLY_RECURRENCE["ID"]
         start_datetime = START_TIME
         end_datetime = END_TIME
-        properties = {
-            "start_datetime": datetime_to_str(start_datetime),
-            "end_datetime": datetime_to_str(end_datetime),
-        }
-
-        asset_types = {
-            MONTHLY_RECURRENCE_KEY: recurrence_href,
-            MONTHLY_RECURRENCE_OBSERVATIONS_KEY: observations_href,
-        }
-
-        for k, v in asset_types.items():
-            assets[k] = assemble_asset(
-                ITEM_ASSETS[MONTHLY_RECURRENCE["ID"]][k],
-                v,
-                destination,
-                read_href_modifier,
-            )
+        hrefs = [
+            (MONTHLY_RECURRENCE_KEY, recurrence_href),
+            (MONTHLY_RECURRENCE_OBSERVATIONS_KEY, observations_href),
+        ]
 
     elif collection_name == "YearlyClassification":
         year = os.path.dirname(source.split("yearlyClassification")[1])
         item_id += f"_{year}"
 
+        collection_id = YEARLY_CLASSIFICATION["ID"]
         start_datetime = str_to_datetime(f"{year}-01-01T00:00:00Z")
         end_datetime = start_datetime + relativedelta(years=1)
-        properties = {
-            "start_datetime": datetime_to_str(start_datetime),
-            "end_datetime": datetime_to_str(end_datetime),
-        }
-
-        assets[YEARLY_CLASSIFICATION_KEY] = assemble_asset(
-            ITEM_ASSETS[YEARLY_CLASSIFICATION["ID"]][YEARLY_CLASSIFICATION_KEY],
-            source,
+        hrefs = [(YEARLY_CLASSIFICATION_KEY, source)]
+
+    else:
+        raise UnexpectedPathError(f"Unknown JRC-GSW dataset for {source}")
+
+    properties = {
+        "start_datetime": datetime_to_str(start_datetime),
+        "end_datetime": datetime_to_str(end_datetime),
+    }
+    return ItemLayout(collection_id, item_id, properties, hrefs)
+
+
+def create_item(
+    source: str,
+    destination: Optional[str] = None,
+    downloaded_version: Optional[str] = "LATEST",
+    data_version: Optional[str] = "VER4-0",
+    read_href_modifier: Optional["ReadHrefModifier"] = None,
+    raster_stats_cache: Optional[Dict[tuple, dict]] = None,
+) -> pystac.Item:
+    """Creates a STAC item for a JRC-GSW dataset.
+
+    Args:
+        source (str): path to COG
+        destination (str, optional): local STAC directory to which
+            asset paths will be made relative
+        downloaded_version (str, optional): child directory within collection directory,
+            indicating the data version. Default: "LATEST".
+            Currently, should be one of: LATEST|VER1-0|VER2-0|VER3-0|VER4-0
+        data_version (str, optional): Version of the data. Default: "VER4-0".
+            Currently, should be one of: VER1-0|VER2-0|VER3-0|VER4-0|
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+        raster_stats_cache (dict, optional): raster metadata shared between
+            calls, keyed by the path below ``downloaded_version`` and the
+            file's size and etag
+
+    Returns:
+        pystac.Item: STAC Item object.
+    """
+    use_fsspec()
+
+    layout = item_layout(source, downloaded_version)
+    item_id = layout.item_id
+    properties = dict(layout.properties)
+
+    assets = {}
+    for key, href in layout.hrefs:
+        assets[key] = assemble_asset(
+            ITEM_ASSETS[layout.collection_id][key],
+            href,
             destination,
             read_href_modifier,
+            raster_stats_cache,
+            href.split(downloaded_version, 1)[-1],
         )
 
     first_asset_key = list(assets.keys())[0]
@@ -303,12 +413,93 @@ def create_item(
     return item
 
 
-def create_collection(collection_defn: dict) -> pystac.Collection:
+def create_versioned_items(
+    source: str,
+    destination: str,
+    downloaded_versions: List[str] = DOWNLOADED_VERSIONS,
+    source_version: str = "LATEST",
+    read_href_modifier: Optional["ReadHrefModifier"] = None,
+) -> List[pystac.Item]:
+    """Creates linked STAC items for every version of a JRC-GSW dataset.
+
+    The tile's geometry, projection and band metadata are read once and
+    shared between versions; a COG is only opened again if its size or etag
+    differs from a version already read. Versions missing the COG are
+    skipped.
+
+    Args:
+        source (str): path to a COG in any version directory
+        destination (str): local STAC directory. Items for each version are
+            written below ``<destination>/<downloaded_version>`` and their
+            asset paths are made relative to that directory. The version
+            links need the items' self hrefs, so it is required.
+        downloaded_versions (List[str], optional): version directories to
+            catalog, oldest first. Default: VER1-0|VER2-0|VER3-0|VER4-0
+        source_version (str, optional): version directory of ``source``.
+            Default: "LATEST".
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+
+    Returns:
+        List[pystac.Item]: STAC Item objects, oldest first, linked with
+        predecessor, successor and latest version links.
+    """
+    if f"/{source_version}/" not in source:
+        raise ValueError(
+            f"{source} is not in a {source_version} version directory, so the "
+            "other versions cannot be found"
+        )
+
+    raster_stats_cache: Dict[tuple, dict] = {}
+
+    items = []
+    for downloaded_version in downloaded_versions:
+        version_source = source.replace(
+            f"/{source_version}/", f"/{downloaded_version}/", 1
+        )
+        data_version = (
+            LATEST_DATA_VERSION
+            if downloaded_version == "LATEST"
+            else downloaded_version
+        )
+        version_destination = os.path.join(destination, downloaded_version)
+
+        try:
+            item = create_item(
+                version_source,
+                version_destination,
+                downloaded_version,
+                data_version,
+                read_href_modifier,
+                raster_stats_cache,
+            )
+        except FileNotFoundError:
+            logger.warning(f"Skipping {downloaded_version}: {version_source} not found")
+            continue
+
+        item.set_self_href(os.path.join(version_destination, f"{item.id}.json"))
+        items.append(item)
+
+    for i, item in enumerate(items):
+        version = ItemVersionExtension.ext(item)
+        if i > 0:
+            version.predecessor = items[i - 1]
+        if i < len(items) - 1:
+            version.successor = items[i + 1]
+        version.latest = items[-1]
+
+    return items
+
+
+def create_collection(
+    collection_defn: dict, class_areas_href: Optional[str] = None
+) -> pystac.Collection:
     """Create a STAC collection for a European Commission
     Joint Research Centre - Global Surface Water dataset.
 
     Args:
         collection_defn (dict): metadata from collections.py
+        class_areas_href (str, optional): href of the collection's class area
+            summary sidecar, added as an asset
 
     Returns:
         pystac.Collection: pystac collection object
@@ -351,4 +542,18 @@ def create_collection(collection_defn: dict) -> pystac.Collection:
         ),
     )
 
+    if class_areas_href is not None:
+        collection.add_asset(
+            CLASS_AREAS_KEY,
+            Asset(
+                href=class_areas_href,
+                title="Class Areas",
+                description=(
+                    "Area in km² of each class of the categorical assets, per item."
+                ),
+                media_type="application/x-parquet",
+                roles=["metadata"],
+            ),
+        )
+
     return collection
@@ -0,0 +1,177 @@
+import logging
+import math
+import os.path
+from typing import Any, Dict, List, Optional
+
+import fsspec
+import numpy as np
+import pystac
+import rasterio as rio
+
+from stactools.core.io import ReadHrefModifier
+from stactools.jrc_gsw.assets import CLASS_AREAS_FILENAME, SUMMARY_ASSETS
+
+logger = logging.getLogger(__name__)
+
+# Mean earth radius, in km.
+EARTH_RADIUS = 6371.0088
+
+# Rows buffered per collection before they are written as a row group.
+ROW_GROUP_SIZE = 100_000
+
+
+def row_areas(transform: Any, row_off: int, height: int) -> np.ndarray:
+    """Returns the area, in km², of one pixel in each of ``height`` rows of a
+    raster in geographic coordinates, starting at row ``row_off``."""
+    edges = transform.f + transform.e * np.arange(row_off, row_off + height + 1)
+    sin_edges = np.sin(np.radians(edges))
+    width = math.radians(abs(transform.a))
+    return EARTH_RADIUS**2 * width * np.abs(np.diff(sin_edges))
+
+
+def compute_class_areas(
+    href: str, read_href_modifier: Optional[ReadHrefModifier] = None
+) -> Dict[int, float]:
+    """Computes the area, in km², covered by each value of a categorical COG.
+
+    The COG is read one internal block at a time, and each pixel is weighted
+    by its area at its latitude.
+
+    Args:
+        href (str): path to the COG
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+
+    Returns:
+        Dict[int, float]: area per pixel value, for values that occur.
+    """
+    if read_href_modifier:
+        href = read_href_modifier(href)
+
+    with rio.open(href) as ds:
+        totals = np.zeros(np.iinfo(ds.dtypes[0]).max + 1)
+        for _, window in ds.block_windows(1):
+            block = ds.read(1, window=window)
+            areas = row_areas(ds.transform, window.row_off, window.height)
+            weights = np.broadcast_to(areas[:, np.newaxis], block.shape)
+            totals += np.bincount(
+                block.ravel(), weights=weights.ravel(), minlength=totals.size
+            )
+
+    return {int(value): float(totals[value]) for value in np.flatnonzero(totals)}
+
+
+def summarize_item(
+    item: pystac.Item,
+    collection_id: str,
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+) -> List[dict]:
+    """Computes the class areas of an item's categorical assets.
+
+    Args:
+        item (pystac.Item): an item with a self href or absolute asset hrefs
+        collection_id (str): the ID of the item's collection
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+
+    Returns:
+        List[dict]: one row per asset and pixel value.
+    """
+    rows = []
+    for key in SUMMARY_ASSETS.get(collection_id, []):
+        href = item.assets[key].get_absolute_href()
+        for value, area in compute_class_areas(href, read_href_modifier).items():
+            rows.append(
+                {
+                    "item_id": item.id,
+                    "asset": key,
+                    "start_datetime": item.properties["start_datetime"],
+                    "end_datetime": item.properties["end_datetime"],
+                    "class_value": value,
+                    "area_km2": area,
+                }
+            )
+
+    return rows
+
+
+class SummaryWriter:
+    """Streams class area rows into one Parquet sidecar per collection,
+    written to ``<destination>/<collection id>/class-areas.parquet``.
+
+    Requires pyarrow (``pip install stactools-jrc-gsw[summaries]``).
+    """
+
+    def __init__(self, destination: str):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError(
+                "Writing summaries requires pyarrow. "
+                "Install it with `pip install stactools-jrc-gsw[summaries]`."
+            ) from e
+
+        self.destination = destination
+        self.schema = pa.schema(
+            [
+                ("tile_id", pa.dictionary(pa.int32(), pa.string())),
+                ("item_id", pa.dictionary(pa.int32(), pa.string())),
+                ("asset", pa.dictionary(pa.int8(), pa.string())),
+                ("start_datetime", pa.timestamp("s", tz="UTC")),
+                ("end_datetime", pa.timestamp("s", tz="UTC")),
+                ("class_value", pa.uint8()),
+                ("area_km2", pa.float64()),
+            ]
+        )
+        self._rows: Dict[str, List[dict]] = {}
+        self._writers: Dict[str, Any] = {}
+        self._files: Dict[str, Any] = {}
+
+    def href(self, collection_id: str) -> str:
+        return os.path.join(self.destination, collection_id, CLASS_AREAS_FILENAME)
+
+    def write(self, collection_id: str, rows: List[dict]) -> None:
+        buffer = self._rows.setdefault(collection_id, [])
+        buffer.extend(rows)
+        if len(buffer) >= ROW_GROUP_SIZE:
+            self._flush(collection_id)
+
+    def _flush(self, collection_id: str) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from pystac.utils import str_to_datetime
+
+        rows = self._rows.pop(collection_id, [])
+        if not rows:
+            return
+
+        columns: Dict[str, list] = {name: [] for name in self.schema.names}
+        for row in rows:
+            for name in columns:
+                value = row[name]
+                if name.endswith("_datetime"):
+                    value = str_to_datetime(value)
+                columns[name].append(value)
+        table = pa.Table.from_pydict(columns, schema=self.schema)
+
+        if collection_id not in self._writers:
+            href = self.href(collection_id)
+            logger.info(f"Writing class area summaries to {href}")
+            self._files[collection_id] = fsspec.open(href, "wb", auto_mkdir=True).open()
+            self._writers[collection_id] = pq.ParquetWriter(
+                self._files[collection_id], self.schema, compression="zstd"
+            )
+        self._writers[collection_id].write_table(table)
+
+    def close(self) -> None:
+        for collection_id in list(self._rows):
+            self._flush(collection_id)
+        for collection_id, writer in self._writers.items():
+            writer.close()
+            self._files[collection_id].close()
+        self._writers = {}
+        self._files = {}
+
+    def __enter__(self) -> "SummaryWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
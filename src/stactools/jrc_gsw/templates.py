@@ -0,0 +1,165 @@
+import copy
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import pystac
+from pystac.extensions.file import FileExtension
+from pystac.extensions.projection import ProjectionExtension
+from pystac.extensions.raster import RasterExtension
+from pystac.extensions.scientific import ScientificExtension
+from pystac.extensions.version import ItemVersionExtension
+
+from stactools.core.io import ReadHrefModifier
+from stactools.jrc_gsw import stac
+from stactools.jrc_gsw.assets import ITEM_ASSETS
+from stactools.jrc_gsw.constants import CITATION, DOI, EPSG
+
+logger = logging.getLogger(__name__)
+
+
+class ItemTemplate:
+    """Builds the item dictionaries of one collection without pystac objects.
+
+    The parts shared by every item of the collection (extensions, scientific
+    and version fields, links and asset definitions) are rendered once, from
+    a prototype item built exactly as
+    :func:`stactools.jrc_gsw.stac.create_item` builds its items. Each item
+    then only fills in its ID, geometry, datetimes, projection and asset
+    fields, so :meth:`create_item_dict` returns the same dictionary as
+    ``create_item(...).to_dict(include_self_link=False)``, in the same key
+    order.
+
+    Args:
+        collection_id (str): ID of the collection.
+        data_version (str, optional): Version of the data. Default: "VER4-0".
+    """
+
+    def __init__(self, collection_id: str, data_version: str = "VER4-0"):
+        self.collection_id = collection_id
+        self.data_version = data_version
+
+        prototype = pystac.Item(
+            id="",
+            geometry={"type": "Point", "coordinates": [0, 0]},
+            bbox=[0, 0, 0, 0],
+            datetime=None,
+            properties={"start_datetime": "", "end_datetime": ""},
+        )
+        for key, asset_defn in ITEM_ASSETS[collection_id].items():
+            asset = asset_defn.create_asset("")
+            prototype.add_asset(key, asset)
+            FileExtension.ext(asset, add_if_missing=True).size = 0
+            RasterExtension.ext(asset, add_if_missing=True).bands = []
+
+        projection = ProjectionExtension.ext(prototype, add_if_missing=True)
+        projection.epsg = EPSG
+        projection.bbox = []
+        projection.shape = []
+        projection.transform = []
+
+        scientific = ScientificExtension.ext(prototype, add_if_missing=True)
+        scientific.doi = DOI
+        scientific.citation = CITATION
+
+        version = ItemVersionExtension.ext(prototype, add_if_missing=True)
+        version.version = data_version
+
+        self.skeleton = prototype.to_dict(include_self_link=False)
+        self.properties = self.skeleton.pop("properties")
+        self.links = self.skeleton.pop("links")
+        self.assets = self.skeleton.pop("assets")
+
+    def create_item_dict(
+        self,
+        source: str,
+        destination: Optional[str] = None,
+        downloaded_version: str = "LATEST",
+        read_href_modifier: Optional[ReadHrefModifier] = None,
+        raster_stats_cache: Optional[Dict[tuple, dict]] = None,
+    ) -> Dict[str, Any]:
+        """Creates the dictionary of a STAC item, see
+        :func:`stactools.jrc_gsw.stac.create_item`.
+
+        Returns:
+            dict: The item dictionary, without a self link.
+        """
+        layout = stac.item_layout(source, downloaded_version)
+        if layout.collection_id != self.collection_id:
+            raise ValueError(
+                f"{source} belongs to {layout.collection_id}, "
+                f"not {self.collection_id}"
+            )
+
+        assets = {}
+        raster_stats = None
+        for key, href in layout.hrefs:
+            stats = stac.collect_raster_stats(
+                href,
+                read_href_modifier,
+                raster_stats_cache,
+                href.split(downloaded_version, 1)[-1],
+                copy_cached=False,
+            )
+            raster_stats = raster_stats or stats
+
+            asset = dict(self.assets[key])
+            asset["href"] = stac.asset_href(href, destination)
+            asset["file:size"] = stats["size"]
+            asset["raster:bands"] = [dict(band.to_dict()) for band in stats["bands"]]
+            asset["roles"] = list(asset["roles"])
+            assets[key] = asset
+
+        properties = dict(self.properties)
+        properties.update(layout.properties)
+        properties["proj:bbox"] = list(raster_stats["proj_bbox"])
+        properties["proj:shape"] = list(raster_stats["shape"])
+        properties["proj:transform"] = raster_stats["transform"][:6]
+
+        item = dict(self.skeleton)
+        item["stac_extensions"] = list(item["stac_extensions"])
+        item["id"] = layout.item_id
+        item["geometry"] = _copy_geometry(raster_stats["geometry"])
+        item["bbox"] = list(raster_stats["orig_bbox"])
+        item["properties"] = properties
+        item["links"] = [dict(link) for link in self.links]
+        item["assets"] = assets
+        return item
+
+
+def _copy_geometry(geometry: Dict[str, Any]) -> Dict[str, Any]:
+    """Copies a Polygon footprint, much faster than ``copy.deepcopy``."""
+    if geometry["type"] != "Polygon":
+        return copy.deepcopy(geometry)
+    return {
+        "type": "Polygon",
+        "coordinates": [
+            [list(point) for point in ring] for ring in geometry["coordinates"]
+        ],
+    }
+
+
+@lru_cache(maxsize=None)
+def get_template(collection_id: str, data_version: str = "VER4-0") -> ItemTemplate:
+    """Returns the template of a collection, built once per process."""
+    return ItemTemplate(collection_id, data_version)
+
+
+def create_item_dict(
+    source: str,
+    destination: Optional[str] = None,
+    downloaded_version: str = "LATEST",
+    data_version: str = "VER4-0",
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+    raster_stats_cache: Optional[Dict[tuple, dict]] = None,
+) -> Dict[str, Any]:
+    """Creates the dictionary of a STAC item through its collection's cached
+    :class:`ItemTemplate`.
+
+    Takes the arguments of :func:`stactools.jrc_gsw.stac.create_item`, and
+    returns the same as ``create_item(...).to_dict(include_self_link=False)``.
+    """
+    collection_id = stac.item_layout(source, downloaded_version).collection_id
+    return get_template(collection_id, data_version).create_item_dict(
+        source, destination, downloaded_version, read_href_modifier, raster_stats_cache
+    )
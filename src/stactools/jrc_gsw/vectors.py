@@ -0,0 +1,359 @@
+import json
+import logging
+import os.path
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import fsspec
+import numpy as np
+import pystac
+import rasterio as rio
+from affine import Affine
+from rasterio.features import shapes
+from shapely import wkb
+from shapely.affinity import affine_transform
+from shapely.geometry import shape
+from shapely.ops import unary_union
+
+from stactools.core.io import ReadHrefModifier
+from stactools.jrc_gsw.assets import (
+    EXTENT_KEY,
+    EXTENT_VECTOR_KEY,
+    VECTOR_ASSETS,
+    YEARLY_CLASSIFICATION_KEY,
+    YEARLY_PERMANENT_WATER_VECTOR_KEY,
+)
+from stactools.jrc_gsw.collections import AGGREGATED, YEARLY_CLASSIFICATION
+
+logger = logging.getLogger(__name__)
+
+# For each collection, the vector assets produced, the raster asset each is
+# polygonized from and the pixel values that make up its polygons.
+VECTOR_PRODUCTS: Dict[str, Dict[str, Tuple[str, List[int]]]] = {
+    AGGREGATED["ID"]: {EXTENT_VECTOR_KEY: (EXTENT_KEY, [1])},
+    YEARLY_CLASSIFICATION["ID"]: {
+        YEARLY_PERMANENT_WATER_VECTOR_KEY: (YEARLY_CLASSIFICATION_KEY, [3]),
+    },
+}
+
+FORMATS = {
+    "flatgeobuf": (".fgb", "application/vnd.flatgeobuf"),
+    "geoparquet": (".parquet", "application/x-parquet"),
+}
+
+# Features buffered before they are written as a GeoParquet row group.
+ROW_GROUP_SIZE = 10_000
+
+Feature = Tuple[Any, bool]
+
+
+def polygonize(
+    href: str,
+    values: Sequence[int],
+    simplify_tolerance: Optional[float] = None,
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+) -> Iterator[Feature]:
+    """Polygonizes the pixels of a COG that have one of ``values``.
+
+    The COG is read one internal block at a time, a row of blocks after
+    another. Polygons inside a block are yielded as soon as the block is
+    read; polygons touching an edge shared with another block are held back
+    and merged across the seam at the end of each row of blocks. Merged
+    polygons that do not reach the next row are then yielded, so memory is
+    bounded by a row of blocks and the polygons still open across the next
+    row seam, not by the size of the tile.
+
+    Polygons touching the edge of the tile are not simplified, so that their
+    borders still match those of the neighbouring tile; they are simplified
+    by :func:`merge_tile_edges` once unioned.
+
+    Args:
+        href (str): path to the COG
+        values (Sequence[int]): pixel values to polygonize
+        simplify_tolerance (float, optional): tolerance, in CRS units, with
+            which polygons not touching the tile edge are simplified. No
+            simplification by default.
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+
+    Returns:
+        Iterator[Tuple[Polygon, bool]]: polygons, and whether each touches the
+        edge of the tile and may continue into a neighbouring tile.
+    """
+    if read_href_modifier:
+        href = read_href_modifier(href)
+
+    # Polygons are traced in pixel coordinates, where block seams fall on
+    # exact integers, and only georeferenced once they are final.
+    with rio.open(href) as ds:
+        tile_bounds = (0, 0, ds.width, ds.height)
+        transform = ds.transform
+        matrix = [transform.a, transform.b, transform.d, transform.e]
+        matrix += [transform.c, transform.f]
+
+        def finish(polygon: Any) -> Feature:
+            tile_edge = _touches(polygon.bounds, tile_bounds, [True] * 4)
+            polygon = affine_transform(polygon, matrix)
+            if simplify_tolerance and not tile_edge:
+                polygon = polygon.simplify(simplify_tolerance, preserve_topology=True)
+            return polygon, tile_edge
+
+        seams: List[Any] = []
+        for row_off, row in groupby(
+            (window for _, window in ds.block_windows(1)),
+            key=lambda window: window.row_off,
+        ):
+            row_stop = row_off
+            for window in row:
+                row_stop = window.row_off + window.height
+                block = ds.read(1, window=window)
+                mask = np.isin(block, values)
+                if not mask.any():
+                    continue
+
+                block_bounds = (
+                    window.col_off,
+                    window.row_off,
+                    window.col_off + window.width,
+                    row_stop,
+                )
+                internal_edges = [
+                    edge != tile_edge
+                    for edge, tile_edge in zip(block_bounds, tile_bounds)
+                ]
+
+                for geometry, _ in shapes(
+                    mask.astype(np.uint8),
+                    mask=mask,
+                    transform=Affine.translation(window.col_off, window.row_off),
+                ):
+                    polygon = shape(geometry)
+                    if _touches(polygon.bounds, block_bounds, internal_edges):
+                        seams.append(polygon)
+                    else:
+                        yield finish(polygon)
+
+            if not seams:
+                continue
+            # Polygons reaching the seam with the next row of blocks may
+            # still grow; the others are complete.
+            logger.debug(f"Merging {len(seams)} polygons across block seams")
+            merged, seams = _explode(unary_union(seams)), []
+            for polygon in merged:
+                if row_stop < ds.height and polygon.bounds[3] == row_stop:
+                    seams.append(polygon)
+                else:
+                    yield finish(polygon)
+
+
+def _touches(
+    bounds: Sequence[float], edges: Sequence[float], which: Sequence[bool]
+) -> bool:
+    return any(
+        check and bound == edge for bound, edge, check in zip(bounds, edges, which)
+    )
+
+
+def _explode(geometry: Any) -> Iterator[Any]:
+    if geometry.geom_type == "Polygon":
+        yield geometry
+    else:
+        yield from geometry.geoms
+
+
+def write_features(features: Iterable[Feature], href: str, format: str) -> int:
+    """Writes polygons to a FlatGeobuf or GeoParquet file, in EPSG:4326.
+
+    FlatGeobuf requires fiona and GeoParquet requires pyarrow
+    (``pip install stactools-jrc-gsw[vectors]``).
+
+    Returns:
+        int: The number of features written.
+    """
+    if format == "flatgeobuf":
+        return _write_flatgeobuf(features, href)
+    elif format == "geoparquet":
+        return _write_geoparquet(features, href)
+    raise ValueError(f"Unknown vector format: {format}")
+
+
+def _write_flatgeobuf(features: Iterable[Feature], href: str) -> int:
+    try:
+        import fiona
+    except ImportError as e:
+        raise ImportError(
+            "Writing FlatGeobuf requires fiona. "
+            "Install it with `pip install stactools-jrc-gsw[vectors]`."
+        ) from e
+    from shapely.geometry import mapping
+
+    schema = {"geometry": "Polygon", "properties": {"tile_edge": "bool"}}
+    count = 0
+    with fiona.open(
+        href, "w", driver="FlatGeobuf", schema=schema, crs="EPSG:4326"
+    ) as dst:
+        for polygon, tile_edge in features:
+            dst.write(
+                {"geometry": mapping(polygon), "properties": {"tile_edge": tile_edge}}
+            )
+            count += 1
+    return count
+
+
+def _geoparquet_schema() -> Any:
+    import pyarrow as pa
+
+    geo = {
+        "version": "1.0.0",
+        "primary_column": "geometry",
+        "columns": {
+            "geometry": {"encoding": "WKB", "geometry_types": ["Polygon"]},
+        },
+    }
+    return pa.schema(
+        [("geometry", pa.binary()), ("tile_edge", pa.bool_())],
+        metadata={b"geo": json.dumps(geo).encode("utf-8")},
+    )
+
+
+def _write_geoparquet(features: Iterable[Feature], href: str) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError(
+            "Writing GeoParquet requires pyarrow. "
+            "Install it with `pip install stactools-jrc-gsw[vectors]`."
+        ) from e
+
+    schema = _geoparquet_schema()
+    count = 0
+    with fsspec.open(href, "wb", auto_mkdir=True) as f:
+        with pq.ParquetWriter(f, schema, compression="zstd") as writer:
+            geometries: List[bytes] = []
+            tile_edges: List[bool] = []
+            for polygon, tile_edge in features:
+                geometries.append(polygon.wkb)
+                tile_edges.append(tile_edge)
+                if len(geometries) == ROW_GROUP_SIZE:
+                    writer.write_table(
+                        pa.table([geometries, tile_edges], schema=schema)
+                    )
+                    count += len(geometries)
+                    geometries, tile_edges = [], []
+            if geometries or count == 0:
+                writer.write_table(pa.table([geometries, tile_edges], schema=schema))
+                count += len(geometries)
+    return count
+
+
+def read_features(href: str) -> Iterator[Feature]:
+    """Reads polygons written by :func:`write_features`."""
+    if href.endswith(FORMATS["flatgeobuf"][0]):
+        import fiona
+
+        with fiona.open(href) as src:
+            for feature in src:
+                yield shape(feature["geometry"]), feature["properties"]["tile_edge"]
+    else:
+        import pyarrow.parquet as pq
+
+        with fsspec.open(href, "rb") as f:
+            parquet_file = pq.ParquetFile(f)
+            for i in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(i)
+                for geometry, tile_edge in zip(
+                    table.column("geometry").to_pylist(),
+                    table.column("tile_edge").to_pylist(),
+                ):
+                    yield wkb.loads(geometry), tile_edge
+
+
+def merge_tile_edges(
+    hrefs: Iterable[str],
+    destination: str,
+    format: str,
+    simplify_tolerance: Optional[float] = None,
+) -> int:
+    """Merges polygons across tile edges.
+
+    Polygons that touch a tile edge are read from every file, unioned and
+    then simplified; all other polygons are copied through unchanged.
+
+    Args:
+        hrefs (Iterable[str]): vector files written for neighbouring tiles
+        destination (str): the merged output file
+        format (str): ``flatgeobuf`` or ``geoparquet``
+        simplify_tolerance (float, optional): tolerance, in degrees, with
+            which the unioned polygons are simplified. Use the tolerance the
+            files were written with. No simplification by default.
+
+    Returns:
+        int: The number of features written.
+    """
+    hrefs = list(hrefs)
+
+    def merged() -> Iterator[Feature]:
+        edges = []
+        for href in hrefs:
+            for polygon, tile_edge in read_features(href):
+                if tile_edge:
+                    edges.append(polygon)
+                else:
+                    yield polygon, False
+        if edges:
+            for polygon in _explode(unary_union(edges)):
+                if simplify_tolerance:
+                    polygon = polygon.simplify(
+                        simplify_tolerance, preserve_topology=True
+                    )
+                yield polygon, True
+
+    return write_features(merged(), destination, format)
+
+
+def create_vector_assets(
+    item: pystac.Item,
+    collection_id: str,
+    format: str = "geoparquet",
+    simplify_tolerance: Optional[float] = None,
+    read_href_modifier: Optional[ReadHrefModifier] = None,
+) -> Dict[str, str]:
+    """Polygonizes an item's water masks and adds them as vector assets.
+
+    Vector files are written next to the item, as
+    ``<item id>-<asset key><extension>``.
+
+    Args:
+        item (pystac.Item): an item with a self href
+        collection_id (str): the ID of the item's collection
+        format (str, optional): ``flatgeobuf`` or ``geoparquet``.
+            Default: "geoparquet".
+        simplify_tolerance (float, optional): tolerance, in degrees, with
+            which polygons are simplified
+        read_href_modifier (ReadHrefModifier, optional): extra href modifier
+
+    Returns:
+        Dict[str, str]: the hrefs written, by asset key.
+    """
+    extension, media_type = FORMATS[format]
+    item_dir = os.path.dirname(item.get_self_href())
+
+    hrefs = {}
+    for key, (raster_key, values) in VECTOR_PRODUCTS.get(collection_id, {}).items():
+        raster_href = item.assets[raster_key].get_absolute_href()
+        filename = f"{item.id}-{key}{extension}"
+        href = os.path.join(item_dir, filename)
+
+        count = write_features(
+            polygonize(raster_href, values, simplify_tolerance, read_href_modifier),
+            href,
+            format,
+        )
+        logger.info(f"Wrote {count} polygons to {href}")
+
+        asset = VECTOR_ASSETS[collection_id][key].create_asset(f"./{filename}")
+        asset.media_type = media_type
+        item.add_asset(key, asset)
+        hrefs[key] = href
+
+    return hrefs
@@ -0,0 +1,161 @@
+import os
+import time
+import unittest
+from tempfile import TemporaryDirectory
+
+import pystac
+
+from stactools.jrc_gsw import bulk
+from stactools.jrc_gsw.executors import (
+    DaskExecutor,
+    Executor,
+    ProcessExecutor,
+    SerialExecutor,
+)
+
+from tests import test_data
+
+try:
+    from dask.distributed import Client, LocalCluster
+except ImportError:
+    LocalCluster = None
+
+
+def scale(partition, workers=1, key=""):
+    return key, partition * workers
+
+
+FINISHED = []
+
+
+def fail_first(partition):
+    if partition == 0:
+        raise ValueError("first partition failed")
+    time.sleep(0.5)
+    FINISHED.append(partition)
+    return partition
+
+
+class TestBulk(unittest.TestCase):
+    def setUp(self):
+        self.root = test_data.get_path("data-files")
+
+    def test_find_sources(self):
+        sources = bulk.find_sources(self.root)
+
+        self.assertEqual(len(sources), 4)
+        self.assertFalse(any("has_observations" in s for s in sources))
+
+    def test_partition_sources(self):
+        sources = bulk.find_sources(self.root)
+        partitions = bulk.partition_sources(sources)
+
+        self.assertEqual(len(partitions), 4)
+        for partition in partitions:
+            self.assertEqual(partition.tile_id, "0000360000-0000480000")
+            self.assertEqual(len(partition.sources), 1)
+
+    def test_create_items(self):
+        sources = bulk.find_sources(self.root)
+        with TemporaryDirectory() as tmp_dir:
+            batches = list(bulk.create_items(sources, tmp_dir))
+            for batch in batches:
+                bulk.write_item_batch(batch, tmp_dir)
+
+            self.assertEqual(len(batches), 4)
+            collection_dirs = sorted(os.listdir(tmp_dir))
+            self.assertEqual(len(collection_dirs), 4)
+
+            item_path = os.path.join(
+                tmp_dir, "jrc_gsw_aggregated", "0000360000-0000480000.json"
+            )
+            item = pystac.read_file(item_path)
+            self.assertEqual(len(item.assets), 6)
+            self.assertTrue(
+                os.path.exists(item.assets["change"].get_absolute_href()),
+            )
+
+    def test_create_items_with_summaries(self):
+        sources = bulk.find_sources(self.root)
+        with TemporaryDirectory() as tmp_dir:
+            batches = list(bulk.create_items(sources, tmp_dir, summarize=True))
+
+        rows = {
+            batch.collection_id: batch.summaries for batch in batches if batch.summaries
+        }
+        self.assertEqual(
+            sorted(rows),
+            [
+                "jrc_gsw_aggregated",
+                "jrc_gsw_monthly_history",
+                "jrc_gsw_yearly_classification",
+            ],
+        )
+        assets = {row["asset"] for row in rows["jrc_gsw_aggregated"]}
+        self.assertEqual(assets, {"extent", "transitions"})
+        self.assertTrue(
+            all(
+                row["tile_id"] == "0000360000-0000480000"
+                for row in rows["jrc_gsw_aggregated"]
+            )
+        )
+
+    def test_create_items_process_pool(self):
+        sources = bulk.find_sources(self.root)
+        with TemporaryDirectory() as tmp_dir:
+            with ProcessExecutor(workers=2) as executor:
+                batches = list(bulk.create_items(sources, tmp_dir, executor))
+
+        ids = sorted(item["id"] for batch in batches for item in batch.items)
+        self.assertEqual(len(ids), 4)
+        self.assertIn("0000360000-0000480000_1984_04", ids)
+
+    @unittest.skipIf(LocalCluster is None, "dask.distributed is not installed")
+    def test_create_items_dask(self):
+        sources = bulk.find_sources(self.root)
+        with LocalCluster(n_workers=2, processes=False) as cluster:
+            with Client(cluster) as client:
+                with TemporaryDirectory() as tmp_dir:
+                    executor = DaskExecutor(client=client)
+                    batches = list(bulk.create_items(sources, tmp_dir, executor))
+
+        self.assertEqual(sum(len(batch.items) for batch in batches), 4)
+
+    def test_executor_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Executor()
+
+        results = SerialExecutor().map_unordered(scale, [1, 2], workers=3, key="k")
+        self.assertEqual(list(results), [("k", 3), ("k", 6)])
+
+    @unittest.skipIf(LocalCluster is None, "dask.distributed is not installed")
+    def test_dask_passes_kwargs_to_function(self):
+        with LocalCluster(n_workers=1, processes=False) as cluster:
+            with Client(cluster) as client:
+                executor = DaskExecutor(client=client)
+                results = executor.map_unordered(scale, [1, 2], workers=3, key="k")
+                self.assertEqual(sorted(results), [("k", 3), ("k", 6)])
+
+    def test_process_executor_cancels_on_failure(self):
+        start = time.monotonic()
+        with ProcessExecutor(2) as executor:
+            with self.assertRaises(ValueError):
+                list(executor.map_unordered(fail_first, range(20)))
+
+        # Without cancelling, the 19 other partitions take about 5 s.
+        self.assertLess(time.monotonic() - start, 3)
+
+    @unittest.skipIf(LocalCluster is None, "dask.distributed is not installed")
+    def test_dask_cancels_on_failure(self):
+        with LocalCluster(
+            n_workers=1, threads_per_worker=1, processes=False
+        ) as cluster:
+            with Client(cluster) as client:
+                executor = DaskExecutor(client=client)
+                del FINISHED[:]
+                with self.assertRaises(ValueError):
+                    list(executor.map_unordered(fail_first, range(20)))
+                time.sleep(2)
+
+                # The worker runs one partition at a time.
+                self.assertLess(len(FINISHED), 5)
@@ -51,3 +51,27 @@ class CreateCollectionTest(CliTestCase):
             item = pystac.read_file(item_path)
 
         item.validate()
+
+    def test_create_items(self):
+        with TemporaryDirectory() as tmp_dir:
+            result = self.run_command(
+                [
+                    "jrc-gsw",
+                    "create-items",
+                    "-d",
+                    tmp_dir,
+                    "-s",
+                    test_data.get_path("data-files"),
+                    "--backend",
+                    "serial",
+                ]
+            )
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            self.assertEqual(len(os.listdir(tmp_dir)), 4)
+            item_path = os.path.join(
+                tmp_dir,
+                "jrc_gsw_yearly_classification",
+                "0000360000-0000480000_1984.json",
+            )
+            self.assertTrue(os.path.exists(item_path))
@@ -0,0 +1,211 @@
+import os
+import unittest
+from unittest import mock
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio as rio
+from dateutil.relativedelta import relativedelta
+from pystac.utils import datetime_to_str, str_to_datetime
+
+from stactools.jrc_gsw import datacube, stac
+from stactools.jrc_gsw.executors import ProcessExecutor
+from stactools.jrc_gsw.commands import create_jrc_gsw_command
+
+from stactools.testing import CliTestCase
+
+from tests import test_data
+
+try:
+    import zarr
+except ImportError:
+    zarr = None
+
+TILE_ID = "0000360000-0000480000"
+
+
+def monthly_history_items(months):
+    """Items for consecutive months, all pointing at the single test COG."""
+    source = test_data.get_path(
+        f"data-files/MonthlyHistory/LATEST/tiles/1984/1984_04/1984_04-{TILE_ID}.tif"
+    )
+    item = stac.create_item(source)
+    start = str_to_datetime(item.properties["start_datetime"])
+
+    items = []
+    for i in range(months):
+        month = item.clone()
+        month_start = start + relativedelta(months=i)
+        month.id = f"{TILE_ID}_{month_start.year}_{month_start.month:02d}"
+        month.properties["start_datetime"] = datetime_to_str(month_start)
+        month.properties["end_datetime"] = datetime_to_str(
+            month_start + relativedelta(months=1)
+        )
+        month.assets["monthly-history"].href = source
+        items.append(month)
+    return source, items
+
+
+@unittest.skipIf(zarr is None, "zarr is not installed")
+class TestDatacube(unittest.TestCase):
+    def test_export_monthly_history(self):
+        source, items = monthly_history_items(3)
+        with rio.open(source) as ds:
+            expected = ds.read(1)
+
+        with TemporaryDirectory() as tmp_dir:
+            item = datacube.export_monthly_history(
+                list(reversed(items)), tmp_dir, chunk_size=64
+            )
+
+            self.assertEqual(item.id, f"{TILE_ID}_datacube")
+            self.assertEqual(item.properties["start_datetime"], "1984-04-01T00:00:00Z")
+            self.assertEqual(item.properties["end_datetime"], "1984-07-01T00:00:00Z")
+            self.assertEqual(item.properties["proj:shape"], [128, 128])
+            dimensions = item.properties["cube:dimensions"]
+            self.assertEqual(dimensions["time"]["step"], "P1M")
+            self.assertEqual(dimensions["x"]["extent"], [-55.75, -55.718])
+            self.assertEqual(
+                item.properties["cube:variables"]["water"]["dimensions"],
+                ["time", "y", "x"],
+            )
+            asset = item.assets["monthly-history-datacube"]
+            self.assertEqual(asset.href, f"./{TILE_ID}_datacube.zarr")
+
+            group = zarr.open_group(asset.get_absolute_href(), mode="r")
+            water = group["water"]
+            self.assertEqual(water.shape, (3, 128, 128))
+            self.assertEqual(water.chunks, (3, 64, 64))
+            self.assertEqual(water.dtype, np.uint8)
+            for i in range(3):
+                np.testing.assert_array_equal(water[i], expected)
+            self.assertEqual(list(group["time"][:]), [5204, 5234, 5265])
+            self.assertAlmostEqual(group["x"][0], -55.749875)
+            self.assertAlmostEqual(group["y"][0], -15.000125)
+
+    def test_export_dimensions_and_empty_chunks(self):
+        source, items = monthly_history_items(2)
+        with TemporaryDirectory() as tmp_dir:
+            empty = os.path.join(tmp_dir, "empty.tif")
+            with rio.open(source) as src:
+                profile = src.profile
+            with rio.open(empty, "w", **profile) as dst:
+                dst.write(np.zeros((1, 128, 128), dtype=np.uint8))
+            for item in items:
+                item.assets["monthly-history"].href = empty
+
+            item = datacube.export_monthly_history(items, tmp_dir, chunk_size=64)
+
+            water = zarr.open_array(
+                item.assets["monthly-history-datacube"].get_absolute_href(),
+                path="water",
+            )
+            if datacube._zarr_version(zarr) >= 3:
+                dimensions = water.metadata.dimension_names
+            else:
+                dimensions = water.attrs["_ARRAY_DIMENSIONS"]
+            self.assertEqual(list(dimensions), ["time", "y", "x"])
+            self.assertEqual(water.nchunks_initialized, 0)
+
+    def test_export_process_pool(self):
+        _, items = monthly_history_items(2)
+        with TemporaryDirectory() as serial_dir, TemporaryDirectory() as pool_dir:
+            serial = datacube.export_monthly_history(items, serial_dir, chunk_size=32)
+            with ProcessExecutor(workers=2) as executor:
+                pooled = datacube.export_monthly_history(
+                    items, pool_dir, chunk_size=32, executor=executor
+                )
+
+            np.testing.assert_array_equal(
+                zarr.open_array(
+                    serial.assets["monthly-history-datacube"].get_absolute_href(),
+                    path="water",
+                )[:],
+                zarr.open_array(
+                    pooled.assets["monthly-history-datacube"].get_absolute_href(),
+                    path="water",
+                )[:],
+            )
+
+    def test_export_opens_each_cog_once_per_row(self):
+        _, items = monthly_history_items(3)
+        with TemporaryDirectory() as tmp_dir:
+            with mock.patch.object(datacube.rio, "open", wraps=rio.open) as opened:
+                datacube.export_monthly_history(items, tmp_dir, chunk_size=32)
+
+        # Four rows of four chunks, each row opening the three months once.
+        self.assertEqual(opened.call_count, 4 * 3)
+
+    def test_find_monthly_history_items(self):
+        with TemporaryDirectory() as tmp_dir:
+            item_dir = os.path.join(tmp_dir, "jrc_gsw_monthly_history")
+            os.makedirs(item_dir)
+            for name in [
+                "collection.json",
+                f"{TILE_ID}_1984_04.json",
+                f"{TILE_ID}_1984_05.json",
+                "0000400000-0000480000_1984_04.json",
+            ]:
+                # The items are not valid JSON, as they must not be read.
+                with open(os.path.join(item_dir, name), "w") as f:
+                    f.write("{")
+
+            hrefs = datacube.find_monthly_history_items(tmp_dir)
+
+        self.assertEqual(sorted(hrefs), [TILE_ID, "0000400000-0000480000"])
+        self.assertEqual(
+            [os.path.basename(href) for href in hrefs[TILE_ID]],
+            [f"{TILE_ID}_1984_04.json", f"{TILE_ID}_1984_05.json"],
+        )
+
+    def test_export_rejects_other_grids(self):
+        _, items = monthly_history_items(2)
+        items[1].properties["proj:shape"] = [64, 64]
+        with TemporaryDirectory() as tmp_dir:
+            with self.assertRaises(ValueError):
+                datacube.export_monthly_history(items, tmp_dir)
+
+
+@unittest.skipIf(zarr is None, "zarr is not installed")
+class CreateDatacubeTest(CliTestCase):
+    def create_subcommand_functions(self):
+        return [create_jrc_gsw_command]
+
+    def test_create_datacube(self):
+        with TemporaryDirectory() as items_dir, TemporaryDirectory() as tmp_dir:
+            result = self.run_command(
+                [
+                    "jrc-gsw",
+                    "create-items",
+                    "-d",
+                    items_dir,
+                    "-s",
+                    test_data.get_path("data-files"),
+                    "--backend",
+                    "serial",
+                ]
+            )
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            result = self.run_command(
+                [
+                    "jrc-gsw",
+                    "create-datacube",
+                    "-d",
+                    tmp_dir,
+                    "-s",
+                    items_dir,
+                    "--backend",
+                    "serial",
+                ]
+            )
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            self.assertEqual(
+                sorted(os.listdir(tmp_dir)),
+                [f"{TILE_ID}_datacube.json", f"{TILE_ID}_datacube.zarr"],
+            )
+            water = zarr.open_array(
+                os.path.join(tmp_dir, f"{TILE_ID}_datacube.zarr"), path="water"
+            )
+            self.assertEqual(water.shape, (1, 128, 128))
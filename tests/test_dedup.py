@@ -0,0 +1,206 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+from tempfile import TemporaryDirectory
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+import numpy as np
+import pystac
+import rasterio as rio
+
+from stactools.jrc_gsw import bulk, dedup, stac
+
+from tests import test_data
+
+TILE_ID = "0000360000-0000480000"
+YEARLY = f"YearlyClassification/LATEST/tiles/yearlyClassification1984/yearlyClassification1984-{TILE_ID}.tif"  # noqa
+MONTHLY = "MonthlyHistory/LATEST/tiles/1984/1984_{month}/1984_{month}-{tile}.tif"
+
+
+def copy_cog(source, destination, fill=None, **profile):
+    """Copies a COG, optionally retiled or recompressed, or filled with a
+    constant value."""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    with rio.open(source) as src:
+        data = src.read()
+        kwargs = dict(src.profile, **profile)
+    if fill is not None:
+        data[:] = fill
+    with rio.open(destination, "w", **kwargs) as dst:
+        dst.write(data)
+
+
+class TestDedup(unittest.TestCase):
+    def setUp(self):
+        self.yearly_href = test_data.get_path(f"data-files/{YEARLY}")
+
+    def test_hash_pixels(self):
+        digest = dedup.hash_pixels(self.yearly_href, nodata=0)
+
+        self.assertEqual(digest.minimum, 0)
+        self.assertEqual(digest.maximum, 3)
+        self.assertFalse(digest.constant)
+        self.assertFalse(digest.all_nodata)
+        self.assertEqual(dedup.hash_pixels(self.yearly_href, 0, workers=1), digest)
+
+        with TemporaryDirectory() as tmp_dir:
+            retiled = os.path.join(tmp_dir, "retiled.tif")
+            copy_cog(
+                self.yearly_href,
+                retiled,
+                tiled=True,
+                blockxsize=32,
+                blockysize=32,
+                compress="deflate",
+            )
+            self.assertEqual(dedup.hash_pixels(retiled).digest, digest.digest)
+
+            empty = os.path.join(tmp_dir, "empty.tif")
+            copy_cog(self.yearly_href, empty, fill=0)
+            empty_digest = dedup.hash_pixels(empty, nodata=0)
+            self.assertNotEqual(empty_digest.digest, digest.digest)
+            self.assertTrue(empty_digest.constant)
+            self.assertTrue(empty_digest.all_nodata)
+
+            land = os.path.join(tmp_dir, "land.tif")
+            copy_cog(self.yearly_href, land, fill=1)
+            land_digest = dedup.hash_pixels(land, nodata=0)
+            self.assertTrue(land_digest.constant)
+            self.assertFalse(land_digest.all_nodata)
+
+    def test_hash_pixels_opens_once_per_thread(self):
+        with mock.patch.object(dedup, "BAND_HEIGHT", 16):
+            with mock.patch.object(dedup.rio, "open", wraps=rio.open) as opened:
+                banded = dedup.hash_pixels(self.yearly_href, nodata=0, workers=2)
+            with mock.patch.object(dedup.scheduler, "get_scheduler") as get_scheduler:
+                get_scheduler.return_value.call.side_effect = (
+                    lambda href, fn, *args: fn(*args)
+                )
+                dedup.hash_pixels(self.yearly_href, nodata=0, workers=2)
+
+        # The header, then one dataset per thread for the eight bands.
+        self.assertLessEqual(opened.call_count, 3)
+        # The header and every band are read through the scheduler.
+        self.assertEqual(get_scheduler.return_value.call.call_count, 9)
+        self.assertEqual(banded.maximum, 3)
+
+    def test_flag_item(self):
+        item = dedup.flag_item(stac.create_item(self.yearly_href))
+
+        self.assertFalse(item.properties[dedup.CONSTANT])
+        self.assertFalse(item.properties[dedup.ALL_NODATA])
+        asset = item.assets["yearly-classification"]
+        self.assertEqual(
+            asset.extra_fields[dedup.PIXEL_HASH],
+            dedup.hash_pixels(self.yearly_href).digest,
+        )
+        self.assertNotIn(dedup.CONSTANT_VALUE, asset.extra_fields)
+
+    def test_dedup_index(self):
+        index = dedup.DedupIndex()
+        first = {"assets": {"a": {"href": "../data/a.tif", dedup.PIXEL_HASH: "x"}}}
+        second = {"assets": {"a": {"href": "b.tif", dedup.PIXEL_HASH: "x"}}}
+
+        self.assertEqual(index.apply(first, "/catalog/one/item.json"), 0)
+        self.assertEqual(index.apply(second, "/catalog/two/item.json"), 1)
+        self.assertEqual(second["assets"]["a"]["href"], "../data/a.tif")
+        self.assertEqual(first["assets"]["a"]["href"], "../data/a.tif")
+        self.assertEqual(index.duplicates, 1)
+
+    def test_dedup_index_file_size(self):
+        index = dedup.DedupIndex()
+        first = {
+            "assets": {
+                "a": {"href": "/data/a.tif", dedup.PIXEL_HASH: "x", "file:size": 10},
+                "b": {"href": "/data/b.tif", dedup.PIXEL_HASH: "y"},
+            }
+        }
+        second = {
+            "assets": {
+                "a": {"href": "/data/c.tif", dedup.PIXEL_HASH: "x", "file:size": 20},
+                "b": {"href": "/data/d.tif", dedup.PIXEL_HASH: "y", "file:size": 30},
+            }
+        }
+
+        self.assertEqual(index.apply(first, "/catalog/one/item.json"), 0)
+        self.assertEqual(index.apply(second, "/catalog/two/item.json"), 2)
+        self.assertEqual(second["assets"]["a"]["file:size"], 10)
+        self.assertNotIn("file:size", second["assets"]["b"])
+
+    def test_bulk_dedup(self):
+        with TemporaryDirectory() as tmp_dir:
+            data_dir = os.path.join(tmp_dir, "data")
+            shutil.copytree(test_data.get_path("data-files"), data_dir)
+            copy_cog(
+                os.path.join(data_dir, YEARLY),
+                os.path.join(data_dir, YEARLY.replace("1984", "1985")),
+            )
+            copy_cog(
+                os.path.join(data_dir, MONTHLY.format(month="04", tile=TILE_ID)),
+                os.path.join(data_dir, MONTHLY.format(month="05", tile=TILE_ID)),
+                fill=0,
+            )
+
+            destination = os.path.join(tmp_dir, "items")
+            index = dedup.DedupIndex()
+            hrefs = []
+            for batch in bulk.create_items(
+                bulk.find_sources(data_dir), destination, deduplicate=True
+            ):
+                hrefs.extend(
+                    bulk.write_item_batch(batch, destination, None, index, True)
+                )
+
+            ids = sorted(os.path.splitext(os.path.basename(h))[0] for h in hrefs)
+            self.assertEqual(len(ids), 5)
+            self.assertIn(f"{TILE_ID}_1984_04", ids)
+            self.assertIn(f"{TILE_ID}_1985", ids)
+            self.assertNotIn(f"{TILE_ID}_1984_05", ids)
+            self.assertEqual(index.duplicates, 1)
+
+            yearly_dir = os.path.join(destination, "jrc_gsw_yearly_classification")
+            item = pystac.Item.from_file(
+                os.path.join(yearly_dir, f"{TILE_ID}_1985.json")
+            )
+            asset = item.assets["yearly-classification"]
+            self.assertTrue(
+                asset.href.endswith("yearlyClassification1984-" + TILE_ID + ".tif")
+            )
+            self.assertTrue(os.path.exists(asset.get_absolute_href()))
+            np.testing.assert_array_equal(
+                rio.open(asset.get_absolute_href()).read(1),
+                rio.open(os.path.join(data_dir, YEARLY)).read(1),
+            )
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_bulk_skip_empty(self):
+        with TemporaryDirectory() as tmp_dir:
+            data_dir = os.path.join(tmp_dir, "data")
+            os.makedirs(data_dir)
+            copy_cog(
+                test_data.get_path(f"data-files/{YEARLY}"),
+                os.path.join(data_dir, YEARLY),
+                fill=0,
+            )
+
+            destination = os.path.join(tmp_dir, "items")
+            batches = list(
+                bulk.create_items(
+                    bulk.find_sources(data_dir),
+                    destination,
+                    summarize=True,
+                    vector_format="geoparquet",
+                    deduplicate=True,
+                    skip_empty=True,
+                )
+            )
+
+            self.assertEqual(len(batches), 1)
+            self.assertEqual(batches[0].items, [])
+            self.assertEqual(batches[0].summaries, [])
+            self.assertFalse(os.path.exists(destination))
@@ -0,0 +1,97 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+import pystac
+from pystac.utils import str_to_datetime
+
+from stactools.jrc_gsw import bulk
+from stactools.jrc_gsw.collections import YEARLY_CLASSIFICATION
+from stactools.jrc_gsw.finalize import CollectionFinalizer
+from stactools.jrc_gsw.stac import create_collection
+
+from tests import test_data
+
+
+def item_dict(item_id, bbox, year, size):
+    return {
+        "id": item_id,
+        "bbox": bbox,
+        "properties": {
+            "datetime": None,
+            "start_datetime": f"{year}-01-01T00:00:00Z",
+            "end_datetime": f"{year + 1}-01-01T00:00:00Z",
+            "version": "VER4-0",
+        },
+        "assets": {"yearly-classification": {"href": "x.tif", "file:size": size}},
+        "links": [],
+    }
+
+
+class TestFinalize(unittest.TestCase):
+    def test_add(self):
+        finalizer = CollectionFinalizer(
+            create_collection(YEARLY_CLASSIFICATION),
+            "/stac/jrc_gsw_yearly_classification/collection.json",
+            "/stac/collection.json",
+            link_batch_size=2,
+        )
+        items = [
+            item_dict("a_1984", [-10, -5, 0, 5], 1984, 100),
+            item_dict("b_1990", [0, 0, 10, 10], 1990, 300),
+            item_dict("a_1985", [-10, -5, 0, 5], 1985, 200),
+        ]
+        for item in items:
+            finalizer.add(
+                item, f"/stac/jrc_gsw_yearly_classification/{item['id']}.json"
+            )
+
+        # Two links have been flushed, one is still buffered
+        self.assertEqual(len(finalizer.collection.get_links(pystac.RelType.ITEM)), 2)
+
+        collection = finalizer.finalize()
+
+        item_links = collection.get_links(pystac.RelType.ITEM)
+        self.assertEqual(len(item_links), 3)
+        self.assertEqual(collection.extent.spatial.bboxes, [[-10, -5, 10, 10]])
+        self.assertEqual(
+            collection.extent.temporal.intervals,
+            [
+                [
+                    str_to_datetime("1984-01-01T00:00:00Z"),
+                    str_to_datetime("1991-01-01T00:00:00Z"),
+                ]
+            ],
+        )
+        self.assertEqual(collection.summaries.get_list("version"), ["VER4-0"])
+        file_size = collection.summaries.get_range("file:size")
+        self.assertEqual((file_size.minimum, file_size.maximum), (100, 300))
+
+        self.assertEqual(items[0]["collection"], "jrc_gsw_yearly_classification")
+        links = {link["rel"]: link["href"] for link in items[0]["links"]}
+        self.assertEqual(links["collection"], "./collection.json")
+        self.assertEqual(links["root"], "../collection.json")
+
+    def test_save_collections(self):
+        sources = bulk.find_sources(test_data.get_path("data-files"))
+        with TemporaryDirectory() as tmp_dir:
+            finalizers = {}
+            for batch in bulk.create_items(sources, tmp_dir):
+                finalizer = finalizers.setdefault(
+                    batch.collection_id,
+                    bulk.create_finalizer(batch.collection_id, tmp_dir),
+                )
+                bulk.write_item_batch(batch, tmp_dir, finalizer)
+            bulk.save_collections(finalizers.values(), tmp_dir)
+
+            root = pystac.read_file(os.path.join(tmp_dir, "collection.json"))
+            children = list(root.get_children())
+            self.assertEqual(len(children), 4)
+            items = [item for child in children for item in child.get_items()]
+            self.assertEqual(len(items), 4)
+            for item in items:
+                self.assertIsNotNone(item.get_collection())
+
+            self.assertEqual(
+                root.extent.spatial.bboxes, [[-55.75, -15.032, -55.718, -15.0]]
+            )
@@ -1,8 +1,58 @@
+import subprocess
+import sys
 import unittest
+from tempfile import TemporaryDirectory
 
 import stactools.jrc_gsw
 
+# Modules that must not be imported just to register the plugin.
+HEAVY_MODULES = ["fsspec", "numpy", "pyproj", "pystac", "rasterio", "shapely"]
+
+# Modules that must not be imported to create the collections, which only
+# need pystac.
+RASTER_MODULES = ["fsspec", "numpy", "pyproj", "rasterio", "shapely"]
+
+
+def loaded_modules(code, modules):
+    """Runs code in a fresh interpreter and returns which modules it loaded."""
+    code += f"\nprint(' '.join(m for m in {modules!r} if m in sys.modules))\n"
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys\n" + code],
+        stdout=subprocess.PIPE,
+        check=True,
+        universal_newlines=True,
+    )
+    return result.stdout.strip()
+
 
 class TestModule(unittest.TestCase):
     def test_version(self):
         self.assertIsNotNone(stactools.jrc_gsw.__version__)
+
+    def test_lazy_submodules(self):
+        self.assertTrue(callable(stactools.jrc_gsw.stac.create_item))
+        self.assertEqual(stactools.jrc_gsw.constants.EPSG, 4326)
+        with self.assertRaises(AttributeError):
+            stactools.jrc_gsw.missing
+
+    def test_plugin_registration_imports(self):
+        code = "from stactools.jrc_gsw.commands import create_jrc_gsw_command"
+        self.assertEqual(loaded_modules(code, HEAVY_MODULES), "")
+
+    def test_create_collection_imports(self):
+        with TemporaryDirectory() as tmp_dir:
+            # Schemas are fetched over the network, so validation is skipped.
+            code = (
+                "import click\n"
+                "import pystac\n"
+                "from click.testing import CliRunner\n"
+                "from stactools.jrc_gsw.commands import create_jrc_gsw_command\n"
+                "pystac.STACObject.validate = lambda self, *a, **k: []\n"
+                "cli = click.Group()\n"
+                "create_jrc_gsw_command(cli)\n"
+                "result = CliRunner().invoke(\n"
+                f"    cli, ['jrc-gsw', 'create-collection', '-d', {tmp_dir!r}]\n"
+                ")\n"
+                "assert result.exit_code == 0, result.output\n"
+            )
+            self.assertEqual(loaded_modules(code, RASTER_MODULES), "")
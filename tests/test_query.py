@@ -0,0 +1,264 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest import mock
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio as rio
+
+from stactools.jrc_gsw import bulk
+from stactools.jrc_gsw.commands import create_jrc_gsw_command
+from stactools.jrc_gsw.query import (
+    QUERY_ASSETS,
+    BlockCache,
+    QueryEngine,
+    QueryItem,
+    read_geometries,
+)
+from stactools.jrc_gsw.server import ItemIndex, StacApiServer, parse_datetime
+
+from stactools.testing import CliTestCase
+
+from tests import test_data
+
+TILE_ID = "0000360000-0000480000"
+AGGREGATED = "Aggregated/LATEST/{key}/tiles/{key}-" + TILE_ID + ".tif"
+
+# Pixels 20 to 80 of rows 20 to 120 of the test tile.
+POLYGON = {
+    "type": "Polygon",
+    "coordinates": [
+        [
+            [-55.745, -15.03],
+            [-55.73, -15.03],
+            [-55.73, -15.005],
+            [-55.745, -15.005],
+            [-55.745, -15.03],
+        ]
+    ],
+}
+WINDOW = (slice(20, 120), slice(20, 80))
+
+
+def read_pixels(key):
+    with rio.open(test_data.get_path(f"data-files/{AGGREGATED.format(key=key)}")) as ds:
+        return ds.read(1)
+
+
+def write_items(destination):
+    for batch in bulk.create_items(
+        bulk.find_sources(test_data.get_path("data-files")), destination
+    ):
+        bulk.write_item_batch(batch, destination)
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        write_items(self.tmp_dir.name)
+        self.index = ItemIndex.from_paths([self.tmp_dir.name])
+        self.engine = QueryEngine(self.index, workers=2)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_polygon(self):
+        result = self.engine.query(POLYGON)
+
+        self.assertEqual(
+            sorted(result),
+            [
+                "jrc_gsw_aggregated",
+                "jrc_gsw_monthly_history",
+                "jrc_gsw_yearly_classification",
+            ],
+        )
+        occurrence = result["jrc_gsw_aggregated"]["occurrence"]
+        self.assertEqual(len(occurrence), 1)
+        pixels = read_pixels("occurrence")[WINDOW]
+        self.assertEqual(occurrence[0]["count"], pixels.size)
+        self.assertEqual(occurrence[0]["min"], pixels.min())
+        self.assertEqual(occurrence[0]["max"], pixels.max())
+        self.assertAlmostEqual(occurrence[0]["mean"], pixels.mean())
+        self.assertEqual(occurrence[0]["start_datetime"], "1984-03-01T00:00:00Z")
+
+        transitions = result["jrc_gsw_aggregated"]["transitions"][0]
+        values, counts = np.unique(
+            read_pixels("transitions")[WINDOW], return_counts=True
+        )
+        self.assertEqual(
+            {k: v["count"] for k, v in transitions["classes"].items()},
+            {str(k): int(v) for k, v in zip(values, counts)},
+        )
+        # A 0.015° by 0.025° box near 15°S.
+        self.assertAlmostEqual(transitions["area_km2"], 4.478, places=3)
+
+        yearly = result["jrc_gsw_yearly_classification"]["yearly-classification"]
+        self.assertEqual(
+            [period["start_datetime"] for period in yearly], ["1984-01-01T00:00:00Z"]
+        )
+        self.assertEqual(yearly[0]["count"], pixels.size)
+
+    def test_point(self):
+        occurrence = read_pixels("occurrence")
+        change = read_pixels("change")
+        with rio.open(
+            test_data.get_path(f"data-files/{AGGREGATED.format(key='change')}")
+        ) as ds:
+            row, col = ds.index(-55.7201, -15.0301)
+
+        result = self.engine.query(
+            {"type": "Point", "coordinates": [-55.7201, -15.0301]},
+            collections=["jrc_gsw_aggregated"],
+        )
+
+        self.assertEqual(list(result), ["jrc_gsw_aggregated"])
+        stats = result["jrc_gsw_aggregated"]["occurrence"][0]
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["mean"], occurrence[row, col])
+        stats = result["jrc_gsw_aggregated"]["change"][0]
+        if change[row, col] > 200:
+            self.assertEqual(stats["codes"], {str(change[row, col]): 1})
+            self.assertIsNone(stats["mean"])
+        else:
+            self.assertEqual(stats["mean"], change[row, col])
+
+        self.assertEqual(
+            self.engine.query({"type": "Point", "coordinates": [10, 10]}), {}
+        )
+
+    def test_filters(self):
+        result = self.engine.query(
+            POLYGON,
+            interval=parse_datetime("1984-02-01T00:00:00Z/1984-02-15T00:00:00Z"),
+        )
+        self.assertEqual(list(result), ["jrc_gsw_yearly_classification"])
+
+        result = self.engine.query(
+            POLYGON, collections=["jrc_gsw_monthly_history", "jrc_gsw_aggregated"]
+        )
+        self.assertEqual(
+            sorted(result), ["jrc_gsw_aggregated", "jrc_gsw_monthly_history"]
+        )
+
+    def test_block_cache(self):
+        self.engine.query(POLYGON)
+        misses = self.engine.cache.misses
+        self.assertGreater(misses, 0)
+        self.assertEqual(len(self.engine.cache), misses)
+
+        self.engine.query_many([POLYGON, POLYGON])
+        self.assertEqual(self.engine.cache.misses, misses)
+        self.assertEqual(self.engine.cache.hits, misses)
+
+    def test_block_cache_eviction(self):
+        cache = BlockCache(max_bytes=200)
+        for i in range(3):
+            cache.put(("a", 0, i), np.zeros(100, dtype=np.uint8))
+        cache.get(("a", 0, 1))
+        cache.put(("a", 0, 3), np.zeros(100, dtype=np.uint8))
+
+        self.assertEqual(list(cache.blocks), [("a", 0, 1), ("a", 0, 3)])
+        self.assertEqual(cache.nbytes, 200)
+        self.assertIsNone(cache.get(("a", 0, 0)))
+
+    def test_server_query(self):
+        server = StacApiServer(self.index, port=0)
+        result = server.route(
+            "POST", "/query", json.dumps({"geometry": POLYGON}).encode("utf-8")
+        )
+        self.assertEqual(result, self.engine.query(POLYGON))
+
+        result = server.route(
+            "POST",
+            "/query",
+            json.dumps(
+                {"geometries": [POLYGON], "collections": ["jrc_gsw_aggregated"]}
+            ).encode("utf-8"),
+        )
+        self.assertEqual(list(result["results"][0]), ["jrc_gsw_aggregated"])
+
+    def test_server_query_errors(self):
+        server = StacApiServer(self.index, port=0)
+        for params in [
+            {},
+            {"geometry": {"type": "Point"}},
+            {"geometry": {"type": "Circle", "coordinates": [0, 0]}},
+            {"geometries": POLYGON},
+        ]:
+            body = json.dumps(params).encode("utf-8")
+            status, _ = asyncio.run(server.respond("POST", "/query", body))
+            self.assertEqual(status, 400, msg=params)
+
+        # Errors other than invalid input are server errors.
+        server.query_engine = QueryEngine(self.index)
+        body = json.dumps({"geometry": POLYGON}).encode("utf-8")
+        with mock.patch.object(
+            server.query_engine, "query_many", side_effect=KeyError("href")
+        ):
+            status, _ = asyncio.run(server.respond("POST", "/query", body))
+        self.assertEqual(status, 500)
+
+    def test_items_cache(self):
+        self.engine.query(POLYGON)
+        self.assertGreater(len(self.engine.items), 0)
+        for item in self.engine.items.values():
+            self.assertIsInstance(item, QueryItem)
+            self.assertLessEqual(
+                set(item.hrefs), set(QUERY_ASSETS.get(item.collection_id, []))
+            )
+
+    def test_read_geometries(self):
+        self.assertEqual(
+            read_geometries("-55.74,-15.01"),
+            [{"type": "Point", "coordinates": [-55.74, -15.01]}],
+        )
+        feature_collection = {
+            "type": "FeatureCollection",
+            "features": [{"type": "Feature", "geometry": POLYGON, "properties": {}}],
+        }
+        self.assertEqual(read_geometries(json.dumps(feature_collection)), [POLYGON])
+        for value in ["not a geometry", "5", "[1, 2]", '{"type": "Feature"}']:
+            with self.assertRaises(ValueError, msg=value):
+                read_geometries(value)
+
+
+class QueryCommandTest(CliTestCase):
+    def create_subcommand_functions(self):
+        return [create_jrc_gsw_command]
+
+    def test_query(self):
+        with TemporaryDirectory() as tmp_dir:
+            write_items(tmp_dir)
+            geometry_path = os.path.join(tmp_dir, "zone.geojson")
+            with open(geometry_path, "w") as f:
+                json.dump(POLYGON, f)
+
+            result = self.run_command(
+                [
+                    "jrc-gsw",
+                    "query",
+                    "-s",
+                    tmp_dir,
+                    "-g",
+                    geometry_path,
+                    "-c",
+                    "jrc_gsw_yearly_classification",
+                ]
+            )
+            self.assertEqual(result.exit_code, 0, msg="\n{}".format(result.output))
+
+            # Warnings are copied to the output, after the JSON.
+            output = json.loads(result.stdout)
+            self.assertEqual(list(output), ["jrc_gsw_yearly_classification"])
+
+    def test_query_invalid_geometry(self):
+        with TemporaryDirectory() as tmp_dir:
+            for geometry in ["5", "[1, 2]", '{"type": "Point"}']:
+                result = self.run_command(
+                    ["jrc-gsw", "query", "-s", tmp_dir, "-g", geometry]
+                )
+                self.assertEqual(result.exit_code, 2, msg=result.output)
+                self.assertIn("Invalid", result.output)
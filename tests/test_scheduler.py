@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tempfile import TemporaryDirectory
+
+from stactools.jrc_gsw import bulk, scheduler, stac
+
+from tests import test_data
+
+TILE_ID = "0000360000-0000480000"
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """Serves the test data with byte ranges, like a remote object store,
+    adding latency and answering the first ``throttle`` requests with
+    429."""
+
+    root = test_data.get_path("data-files")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def respond(self, send_body):
+        server = self.server
+        time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            throttled = server.throttle > 0
+            if throttled:
+                server.throttle -= 1
+                server.throttled += 1
+        path = os.path.join(self.root, self.path.lstrip("/"))
+        if throttled or not os.path.isfile(path):
+            self.send_response(429 if throttled else 404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            data = f.read()
+        start, end = 0, len(data) - 1
+        if "Range" in self.headers:
+            first, last = self.headers["Range"].split("=")[1].split("-")
+            start, end = int(first), min(int(last or end), end)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data[start : end + 1])
+
+
+class TestScheduler(unittest.TestCase):
+    def test_error_status(self):
+        self.assertEqual(
+            scheduler.error_status(OSError("HTTP response code: 429")), 429
+        )
+        try:
+            try:
+                raise OSError("HTTP response code: 503")
+            except OSError as e:
+                raise FileNotFoundError("http://example.com/a.tif") from e
+        except FileNotFoundError as e:
+            self.assertEqual(scheduler.error_status(e), 503)
+            self.assertTrue(scheduler.is_retryable(e))
+        self.assertFalse(scheduler.is_retryable(FileNotFoundError("a.tif")))
+
+    def test_adaptive_limiter(self):
+        limiter = scheduler.AdaptiveLimiter(max_limit=8)
+        self.assertEqual(limiter.limit, 4)
+
+        limiter.acquire()
+        limiter.release(throttled=True)
+        self.assertEqual(limiter.limit, 2)
+
+        for _ in range(20):
+            limiter.acquire()
+            limiter.release()
+        self.assertGreater(limiter.limit, 4)
+        self.assertLessEqual(limiter.limit, 8)
+
+    def test_token_bucket(self):
+        bucket = scheduler.TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+    def test_concurrency_limit(self):
+        io_scheduler = scheduler.IOScheduler(max_concurrency=2)
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+
+        def read():
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            time.sleep(0.01)
+            with lock:
+                in_flight.pop()
+
+        threads = [
+            threading.Thread(
+                target=io_scheduler.call, args=("https://example.com/a.tif", read)
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(peak), 8)
+        self.assertLessEqual(max(peak), 2)
+
+    def test_retries(self):
+        io_scheduler = scheduler.IOScheduler(max_retries=2, backoff=0.001)
+        calls = []
+
+        def read():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OSError("HTTP response code: 429")
+            return "data"
+
+        self.assertEqual(io_scheduler.call("https://example.com/a.tif", read), "data")
+        # Halved twice from 4, then increased by one by the success.
+        self.assertEqual(io_scheduler.limiters["example.com"].limit, 2)
+
+        calls.clear()
+        io_scheduler.max_retries = 1
+        with self.assertRaises(OSError):
+            io_scheduler.call("https://example.com/a.tif", read)
+
+        # Local reads are neither limited nor retried.
+        calls.clear()
+        with self.assertRaises(OSError):
+            io_scheduler.call("/data/a.tif", read)
+        self.assertEqual(len(calls), 1)
+
+    def test_configure(self):
+        default = scheduler.get_scheduler()
+        try:
+            io_scheduler = scheduler.configure(max_concurrency=3, rate_limit=10)
+            self.assertIs(scheduler.get_scheduler(), io_scheduler)
+            self.assertIs(scheduler.configure(max_concurrency=3), io_scheduler)
+            self.assertEqual(io_scheduler.rate_limit, 10)
+        finally:
+            scheduler._scheduler = default
+
+
+class TestThrottledSource(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+        self.server.lock = threading.Lock()
+        self.server.latency = 0.005
+        self.server.requests = 0
+        self.server.throttle = 0
+        self.server.throttled = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.root = f"http://{host}:{port}"
+
+        self.default = scheduler.get_scheduler()
+        scheduler.configure(backoff=0.01)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        scheduler._scheduler = self.default
+
+    def test_create_item(self):
+        self.server.throttle = 3
+        source = (
+            f"{self.root}/YearlyClassification/LATEST/tiles/yearlyClassification1984/"
+            f"yearlyClassification1984-{TILE_ID}.tif"
+        )
+
+        item = stac.create_item(source)
+
+        self.assertEqual(item.id, f"{TILE_ID}_1984")
+        self.assertEqual(self.server.throttled, 3)
+        self.assertGreater(self.server.requests, 3)
+        limiter = scheduler.get_scheduler().limiters[self.root.split("//")[1]]
+        self.assertLess(limiter.limit, 4)
+
+    def test_create_items(self):
+        self.server.throttle = 2
+        sources = [
+            f"{self.root}/Aggregated/LATEST/extent/tiles/extent-{TILE_ID}.tif",
+            f"{self.root}/MonthlyHistory/LATEST/tiles/1984/1984_04/1984_04-{TILE_ID}.tif",  # noqa
+        ]
+
+        with TemporaryDirectory() as tmp_dir:
+            batches = list(
+                bulk.create_items(
+                    sources,
+                    tmp_dir,
+                    io_options={"max_concurrency": 2, "backoff": 0.01},
+                )
+            )
+
+        self.assertEqual(sum(len(batch.items) for batch in batches), 2)
+        self.assertEqual(self.server.throttled, 2)
+        self.assertEqual(scheduler.get_scheduler().max_concurrency, 2)
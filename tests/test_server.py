@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from stactools.jrc_gsw import bulk
+from stactools.jrc_gsw.server import ItemIndex, StacApiServer
+
+from tests import test_data
+
+TILES = {
+    "0000360000-0000480000": [-55.75, -15.032, -55.718, -15.0],
+    "0000400000-0000480000": [10.0, 40.0, 20.0, 50.0],
+}
+
+
+def write_items(tmp_dir):
+    """Writes a create-items style tree with two tiles and three years."""
+    collection_dir = os.path.join(tmp_dir, "jrc_gsw_yearly_classification")
+    os.makedirs(collection_dir)
+    with open(os.path.join(collection_dir, "collection.json"), "w") as f:
+        json.dump(
+            {
+                "type": "Collection",
+                "id": "jrc_gsw_yearly_classification",
+                "links": [],
+            },
+            f,
+        )
+    for tile_id, bbox in TILES.items():
+        for year in (1984, 1985, 1986):
+            item_id = f"{tile_id}_{year}"
+            item = {
+                "type": "Feature",
+                "id": item_id,
+                "collection": "jrc_gsw_yearly_classification",
+                "bbox": bbox,
+                "geometry": None,
+                "properties": {
+                    "datetime": None,
+                    "start_datetime": f"{year}-01-01T00:00:00Z",
+                    "end_datetime": f"{year + 1}-01-01T00:00:00Z",
+                },
+                "assets": {"yearly-classification": {"href": "../data/x.tif"}},
+                "links": [],
+            }
+            with open(os.path.join(collection_dir, f"{item_id}.json"), "w") as f:
+                json.dump(item, f)
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = TemporaryDirectory()
+        write_items(self.tmp_dir.name)
+        self.index = ItemIndex.from_paths([self.tmp_dir.name])
+        self.server = StacApiServer(self.index, port=0)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_index(self):
+        self.assertEqual(len(self.index.entries), 6)
+        self.assertIn("jrc_gsw_yearly_classification", self.index.collections)
+
+    def test_search_filters(self):
+        result = self.server.search({"bbox": "-56,-16,-55,-14", "limit": 100})
+        self.assertEqual(len(result["features"]), 3)
+
+        result = self.server.search({"datetime": "1985-06-01T00:00:00Z"})
+        self.assertEqual(
+            sorted(f["id"] for f in result["features"]),
+            ["0000360000-0000480000_1985", "0000400000-0000480000_1985"],
+        )
+
+        result = self.server.search(
+            {"bbox": [9, 39, 21, 51], "datetime": "1986-06-01T00:00:00Z/.."}
+        )
+        self.assertEqual(
+            [f["id"] for f in result["features"]], ["0000400000-0000480000_1986"]
+        )
+
+        feature = result["features"][0]
+        self.assertTrue(
+            os.path.isabs(feature["assets"]["yearly-classification"]["href"])
+        )
+
+    def test_search_intersects(self):
+        point = {"type": "Point", "coordinates": [15, 45]}
+        result = self.server.search({"intersects": point, "limit": 100}, "POST")
+        self.assertEqual(
+            sorted(f["id"] for f in result["features"]),
+            [f"0000400000-0000480000_{year}" for year in (1984, 1985, 1986)],
+        )
+
+        result = self.server.search(
+            {"intersects": json.dumps({"type": "Point", "coordinates": [100, 50]})}
+        )
+        self.assertEqual(result["features"], [])
+
+    def test_search_errors(self):
+        for params in [
+            {"limit": "abc"},
+            {"intersects": {"type": "Point"}},
+            {"intersects": "not json"},
+            {"bbox": "-56,-16,-55,-14", "intersects": {"type": "Point"}},
+        ]:
+            status, _ = asyncio.run(
+                self.server.respond(
+                    "POST", "/search", json.dumps(params).encode("utf-8")
+                )
+            )
+            self.assertEqual(status, 400, msg=params)
+
+        status, _ = asyncio.run(self.server.respond("GET", "/search?limit=abc", b""))
+        self.assertEqual(status, 400)
+
+    def test_search_paging(self):
+        ids = []
+        params = {"limit": 4}
+        while True:
+            result = self.server.search(params, method="POST")
+            ids.extend(f["id"] for f in result["features"])
+            next_links = [link for link in result["links"] if link["rel"] == "next"]
+            if not next_links:
+                break
+            params = next_links[0]["body"]
+
+        self.assertEqual(len(ids), 6)
+        self.assertEqual(len(set(ids)), 6)
+
+    def test_http(self):
+        async def run():
+            await self.server.start()
+            try:
+                reader, writer = await asyncio.open_connection(
+                    "127.0.0.1", self.server.port
+                )
+                responses = []
+                for _ in range(2):
+                    writer.write(
+                        b"GET /collections/jrc_gsw_yearly_classification/items"
+                        b"?limit=2 HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                    )
+                    await writer.drain()
+                    status = await reader.readline()
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line == b"\r\n":
+                            break
+                        name, _, value = line.decode().partition(":")
+                        headers[name.lower()] = value.strip()
+                    body = await reader.readexactly(int(headers["content-length"]))
+                    responses.append((status, json.loads(body)))
+                writer.close()
+                return responses
+            finally:
+                await self.server.close()
+
+        responses = asyncio.run(run())
+
+        status, body = responses[0]
+        self.assertIn(b"200", status)
+        self.assertEqual(body["numberReturned"], 2)
+        next_link = [link for link in body["links"] if link["rel"] == "next"][0]
+        self.assertIn("token=", next_link["href"])
+        self.assertEqual(responses[1][1], body)
+        self.assertEqual(len(self.server.cache), 1)
+
+    def test_not_found(self):
+        async def run():
+            return await self.server.respond("GET", "/collections/missing", b"")
+
+        status, _ = asyncio.run(run())
+        self.assertEqual(status, 404)
+
+
+class TestServerCreateItems(unittest.TestCase):
+    def test_items_without_collection_field(self):
+        with TemporaryDirectory() as tmp_dir:
+            for batch in bulk.create_items(
+                bulk.find_sources(test_data.get_path("data-files")), tmp_dir
+            ):
+                bulk.write_item_batch(batch, tmp_dir)
+            server = StacApiServer(ItemIndex.from_paths([tmp_dir]), port=0)
+
+            result = server.route("GET", "/collections/jrc_gsw_aggregated/items", b"")
+            self.assertEqual(result["numberReturned"], 1)
+            feature = result["features"][0]
+            self.assertNotIn("None", json.dumps(feature["links"]))
+            self.assertEqual(feature["collection"], "jrc_gsw_aggregated")
+
+            self_link = [link for link in feature["links"] if link["rel"] == "self"][0]
+            path = self_link["href"][len(server.url) :]
+            self.assertEqual(server.route("GET", path, b"")["id"], feature["id"])
+
+            result = server.search(
+                {"collections": ["jrc_gsw_monthly_history", "jrc_gsw_aggregated"]}
+            )
+            self.assertEqual(result["numberReturned"], 2)
@@ -1,8 +1,18 @@
 import os
+import shutil
 import unittest
 from dateutil.relativedelta import relativedelta
+from tempfile import TemporaryDirectory
+from unittest import mock
 
-from stactools.jrc_gsw.stac import create_collection, create_item
+from pystac.extensions.version import ItemVersionExtension
+
+from stactools.jrc_gsw import stac
+from stactools.jrc_gsw.stac import (
+    create_collection,
+    create_item,
+    create_versioned_items,
+)
 from pystac.utils import datetime_to_str, str_to_datetime
 
 from stactools.jrc_gsw.collections import AGGREGATED
@@ -120,7 +130,66 @@ class TestSTAC(unittest.TestCase):
         self.assertIn("version", item.properties.keys())
         item.validate()
 
+    def test_create_versioned_items(self):
+        tile_id = "0000360000-0000480000"
+        with TemporaryDirectory() as tmp_dir:
+            for version in ["VER3-0", "VER4-0"]:
+                shutil.copytree(
+                    test_data.get_path("data-files/Aggregated/LATEST"),
+                    os.path.join(tmp_dir, "data", "Aggregated", version),
+                )
+            source = os.path.join(
+                tmp_dir,
+                "data",
+                "Aggregated",
+                "VER4-0",
+                "change",
+                "tiles",
+                f"change-{tile_id}.tif",
+            )
+
+            with mock.patch.object(
+                stac, "read_raster_metadata", wraps=stac.read_raster_metadata
+            ) as read_raster_metadata:
+                items = create_versioned_items(
+                    source,
+                    os.path.join(tmp_dir, "stac"),
+                    ["VER2-0", "VER3-0", "VER4-0"],
+                    source_version="VER4-0",
+                )
+
+            # VER2-0 is missing and VER4-0 reuses the metadata read for VER3-0
+            self.assertEqual(len(items), 2)
+            self.assertEqual(read_raster_metadata.call_count, 6)
+
+            old, new = items
+            self.assertEqual(old.properties["version"], "VER3-0")
+            self.assertEqual(new.properties["version"], "VER4-0")
+            self.assertEqual(old.geometry, new.geometry)
+            self.assertIn("VER3-0", old.get_self_href())
+            self.assertEqual(ItemVersionExtension.ext(old).successor, new)
+            self.assertEqual(ItemVersionExtension.ext(new).predecessor, old)
+            self.assertEqual(ItemVersionExtension.ext(old).latest, new)
+            self.assertIn(
+                "VER3-0", old.assets["change"].get_absolute_href().split("data")[1]
+            )
+
+            for link in old.to_dict()["links"] + new.to_dict()["links"]:
+                self.assertIsNotNone(link["href"])
+
+            with self.assertRaises(ValueError):
+                create_versioned_items(
+                    source, os.path.join(tmp_dir, "stac"), ["VER3-0", "VER4-0"]
+                )
+
     def test_create_collection(self):
         collection = create_collection(AGGREGATED)
         collection.set_root(None)
         collection.validate()
+
+    def test_create_collection_with_class_areas(self):
+        collection = create_collection(AGGREGATED, "./class-areas.parquet")
+
+        asset = collection.assets["class-areas"]
+        self.assertEqual(asset.href, "./class-areas.parquet")
+        self.assertEqual(asset.media_type, "application/x-parquet")
@@ -0,0 +1,66 @@
+import math
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from stactools.jrc_gsw import summaries
+from stactools.jrc_gsw.collections import YEARLY_CLASSIFICATION
+from stactools.jrc_gsw.stac import create_item
+
+from tests import test_data
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+TILE_ID = "0000360000-0000480000"
+
+
+class TestSummaries(unittest.TestCase):
+    def setUp(self):
+        self.yearly_href = test_data.get_path(
+            "data-files/YearlyClassification/LATEST/tiles/yearlyClassification1984/"
+            f"yearlyClassification1984-{TILE_ID}.tif"
+        )
+
+    def test_compute_class_areas(self):
+        areas = summaries.compute_class_areas(self.yearly_href)
+
+        self.assertEqual(sorted(areas), [0, 1, 3])
+
+        # The areas of all classes add up to the area of the tile's bounds,
+        # -55.75, -15.032, -55.718, -15.0.
+        expected = (
+            summaries.EARTH_RADIUS**2
+            * math.radians(0.032)
+            * (math.sin(math.radians(-15.0)) - math.sin(math.radians(-15.032)))
+        )
+        self.assertAlmostEqual(sum(areas.values()), expected, places=6)
+
+        # The tile is small enough that every pixel has about the same area.
+        self.assertAlmostEqual(areas[3] / sum(areas.values()), 27 / 128**2, places=5)
+
+    def test_summary_writer(self):
+        item_dir = os.path.dirname(self.yearly_href)
+        item = create_item(self.yearly_href, item_dir)
+        item.set_self_href(os.path.join(item_dir, "item.json"))
+        rows = summaries.summarize_item(item, YEARLY_CLASSIFICATION["ID"])
+        for row in rows:
+            row["tile_id"] = TILE_ID
+        self.assertEqual(len(rows), 3)
+
+        if pq is None:
+            self.skipTest("pyarrow is not installed")
+
+        with TemporaryDirectory() as tmp_dir:
+            with summaries.SummaryWriter(tmp_dir) as writer:
+                writer.write(YEARLY_CLASSIFICATION["ID"], rows)
+                href = writer.href(YEARLY_CLASSIFICATION["ID"])
+
+            self.assertTrue(os.path.exists(href))
+            table = pq.read_table(href)
+
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column("item_id").to_pylist(), [f"{TILE_ID}_1984"] * 3)
+        self.assertEqual(sorted(table.column("class_value").to_pylist()), [0, 1, 3])
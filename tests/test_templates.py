@@ -0,0 +1,47 @@
+import json
+import unittest
+from tempfile import TemporaryDirectory
+
+from stactools.jrc_gsw import bulk, stac, templates
+from stactools.jrc_gsw.collections import AGGREGATED
+
+from tests import test_data
+
+
+class TestTemplates(unittest.TestCase):
+    def setUp(self):
+        self.sources = bulk.find_sources(test_data.get_path("data-files"))
+
+    def test_matches_create_item(self):
+        with TemporaryDirectory() as tmp_dir:
+            for source in self.sources:
+                for data_version in ["VER4-0", "VER2-0"]:
+                    expected = stac.create_item(
+                        source, tmp_dir, data_version=data_version
+                    ).to_dict(include_self_link=False)
+                    item = templates.create_item_dict(
+                        source, tmp_dir, data_version=data_version
+                    )
+
+                    self.assertEqual(item, expected)
+                    self.assertEqual(json.dumps(item), json.dumps(expected))
+
+    def test_items_do_not_share_values(self):
+        cache = {}
+        source = self.sources[0]
+        first = templates.create_item_dict(source, raster_stats_cache=cache)
+        first["geometry"]["coordinates"][0][0][0] = 0
+        first["assets"]["extent"]["roles"].append("overview")
+        first["properties"]["proj:shape"][0] = 0
+        first["assets"]["extent"]["raster:bands"][0]["nodata"] = 0
+
+        second = templates.create_item_dict(source, raster_stats_cache=cache)
+        self.assertEqual(
+            second, stac.create_item(source).to_dict(include_self_link=False)
+        )
+
+    def test_template_is_cached(self):
+        template = templates.get_template(AGGREGATED["ID"])
+        self.assertIs(templates.get_template(AGGREGATED["ID"]), template)
+        with self.assertRaises(ValueError):
+            template.create_item_dict(self.sources[-1])
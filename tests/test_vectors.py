@@ -0,0 +1,183 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import rasterio as rio
+from affine import Affine
+from shapely.geometry import box
+
+from stactools.jrc_gsw import bulk, vectors
+
+from tests import test_data
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+TILE_ID = "0000360000-0000480000"
+PIXEL_AREA = 0.00025**2
+
+
+def write_mask(href, data, col_off=0, block_size=16):
+    """Writes a tiled uint8 mask on a 0.00025° grid, ``col_off`` pixels east
+    of -55.75."""
+    with rio.open(
+        href,
+        "w",
+        driver="GTiff",
+        width=data.shape[1],
+        height=data.shape[0],
+        count=1,
+        dtype="uint8",
+        crs="EPSG:4326",
+        transform=Affine(0.00025, 0, -55.75 + col_off * 0.00025, 0, -0.00025, -15),
+        tiled=True,
+        blockxsize=block_size,
+        blockysize=block_size,
+    ) as dst:
+        dst.write(data, 1)
+
+
+class TestVectors(unittest.TestCase):
+    def setUp(self):
+        self.extent_href = test_data.get_path(
+            f"data-files/Aggregated/LATEST/extent/tiles/extent-{TILE_ID}.tif"
+        )
+        self.yearly_href = test_data.get_path(
+            "data-files/YearlyClassification/LATEST/tiles/yearlyClassification1984/"
+            f"yearlyClassification1984-{TILE_ID}.tif"
+        )
+
+    def test_polygonize(self):
+        features = list(vectors.polygonize(self.yearly_href, [3]))
+
+        self.assertEqual(len(features), 12)
+        area = sum(polygon.area for polygon, _ in features)
+        self.assertAlmostEqual(area / PIXEL_AREA, 27, places=3)
+        for polygon, _ in features:
+            self.assertTrue(polygon.is_valid)
+            minx, miny, maxx, maxy = polygon.bounds
+            self.assertGreaterEqual(minx, -55.75)
+            self.assertLessEqual(maxy, -15.0)
+
+    def test_polygonize_merges_block_seams(self):
+        # The test COG is stored in two blocks of 64 rows; its water extent
+        # is a single region spanning both.
+        features = list(vectors.polygonize(self.extent_href, [1]))
+
+        self.assertEqual(len(features), 1)
+        polygon, tile_edge = features[0]
+        self.assertAlmostEqual(polygon.area / PIXEL_AREA, 13979, places=3)
+        self.assertTrue(tile_edge)
+
+    def test_polygonize_simplify(self):
+        # A jagged lake inside the tile, and one crossing its east edge.
+        data = np.zeros((64, 64), dtype=np.uint8)
+        for row in range(8, 56):
+            data[row, 8 : 24 + row % 3] = 1
+            data[row, 40 + row % 3 :] = 1
+
+        with TemporaryDirectory() as tmp_dir:
+            href = os.path.join(tmp_dir, "mask.tif")
+            write_mask(href, data, block_size=64)
+            exact = dict((e, p) for p, e in vectors.polygonize(href, [1]))
+            simplified = dict(
+                (e, p)
+                for p, e in vectors.polygonize(href, [1], simplify_tolerance=0.001)
+            )
+
+        self.assertLess(
+            len(simplified[False].exterior.coords), len(exact[False].exterior.coords)
+        )
+        self.assertTrue(simplified[True].equals(exact[True]))
+
+    def test_polygonize_yields_rows_of_blocks(self):
+        # A lake crossing a seam in the first row of blocks, and one inside a
+        # block of the last row, which is read later.
+        data = np.zeros((64, 64), dtype=np.uint8)
+        data[2:6, 10:20] = 1
+        data[50:54, 2:6] = 1
+
+        with TemporaryDirectory() as tmp_dir:
+            href = os.path.join(tmp_dir, "mask.tif")
+            write_mask(href, data)
+            features = list(vectors.polygonize(href, [1]))
+
+        self.assertEqual(len(features), 2)
+        self.assertAlmostEqual(features[0][0].area / PIXEL_AREA, 40)
+        self.assertAlmostEqual(features[1][0].area / PIXEL_AREA, 16)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_merge_simplified_tile_edges(self):
+        # A lake split between two neighbouring tiles.
+        data = np.zeros((64, 128), dtype=np.uint8)
+        for row in range(8, 56):
+            data[row, 40 + row % 3 : 88 - row % 3] = 1
+
+        with TemporaryDirectory() as tmp_dir:
+            hrefs = []
+            for col_off in (0, 64):
+                tile = os.path.join(tmp_dir, f"tile-{col_off}.tif")
+                write_mask(tile, data[:, col_off : col_off + 64], col_off)
+                hrefs.append(os.path.join(tmp_dir, f"tile-{col_off}.parquet"))
+                vectors.write_features(
+                    vectors.polygonize(tile, [1], simplify_tolerance=0.0005),
+                    hrefs[-1],
+                    "geoparquet",
+                )
+
+            merged_href = os.path.join(tmp_dir, "merged.parquet")
+            vectors.merge_tile_edges(hrefs, merged_href, "geoparquet", 0.0005)
+            merged = list(vectors.read_features(merged_href))
+
+        self.assertEqual(len(merged), 1)
+        polygon, tile_edge = merged[0]
+        self.assertTrue(tile_edge)
+        self.assertEqual(len(polygon.interiors), 0)
+        self.assertTrue(polygon.intersects(box(-55.734, -15.01, -55.734, -15.004)))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_geoparquet(self):
+        with TemporaryDirectory() as tmp_dir:
+            href = os.path.join(tmp_dir, "yearly.parquet")
+            count = vectors.write_features(
+                vectors.polygonize(self.yearly_href, [3]), href, "geoparquet"
+            )
+            self.assertEqual(count, 12)
+
+            features = list(vectors.read_features(href))
+            self.assertEqual(len(features), 12)
+
+            merged_href = os.path.join(tmp_dir, "merged.parquet")
+            vectors.merge_tile_edges([href, href], merged_href, "geoparquet")
+            merged = list(vectors.read_features(merged_href))
+            # Interior polygons are copied from both files, while the copies
+            # of the edge polygon are unioned into one.
+            edges = [polygon for polygon, tile_edge in features if tile_edge]
+            self.assertEqual(len(merged), 2 * (12 - len(edges)) + len(edges))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_create_items_with_vectors(self):
+        sources = bulk.find_sources(test_data.get_path("data-files"))
+        with TemporaryDirectory() as tmp_dir:
+            batches = list(
+                bulk.create_items(sources, tmp_dir, vector_format="geoparquet")
+            )
+            items = {
+                item["id"]: (batch.collection_id, item)
+                for batch in batches
+                for item in batch.items
+            }
+
+            collection_id, item = items[TILE_ID]
+            asset = item["assets"]["extent-vector"]
+            self.assertEqual(asset["type"], "application/x-parquet")
+            self.assertTrue(
+                os.path.exists(os.path.join(tmp_dir, collection_id, asset["href"]))
+            )
+            self.assertIn(
+                "yearly-permanent-water-vector",
+                items[f"{TILE_ID}_1984"][1]["assets"],
+            )